@@ -1,10 +1,13 @@
 from .agent_base import BaseAgent
-from .agents_graph_V2 import StateMachines, Level1Agent, Level2Agent, Level3Agent
+from .agents_graph_V2 import StateMachines, Level1Agent, Level2Agent, Level3Agent, get_state_machine
+from .batch_runner import MeetingBatch
 
 __all__ = [
     'BaseAgent',
     'StateMachines',
     'Level1Agent',
     'Level2Agent',
-    'Level3Agent'
+    'Level3Agent',
+    'get_state_machine',
+    'MeetingBatch'
 ]
@@ -14,22 +14,53 @@ import os
 from langgraph.graph.message import add_messages
 from langchain_community.tools import DuckDuckGoSearchRun
 from jinja2 import Environment, FileSystemLoader
-from langchain_openai import ChatOpenAI
 from langchain.globals import set_llm_cache
-from langchain_community.cache import InMemoryCache
-from langchain_mistralai import ChatMistralAI
-from langchain_cohere import ChatCohere
-from langchain_groq import ChatGroq
-from langchain_google_vertexai import ChatVertexAI
-from langchain_anthropic import ChatAnthropic
-from langchain_nvidia_ai_endpoints import ChatNVIDIA
-from langchain_fireworks import ChatFireworks
-from langchain_community.chat_models import ChatOllama
 from datetime import datetime
+import asyncio
+import hashlib
+import importlib
 import json
+import logging
+import re
+import threading
+import time
+import weakref
 from pathlib import Path
+try:
+    from .rate_limiter import RateLimitScheduler
+    from .llm_cache import SQLiteLLMCache
+    from .llm_pool import LLMClientPool
+    from .tracing import NodeTracer, record_throttle
+    from .semantic_cache import SemanticCache
+except:
+    from rate_limiter import RateLimitScheduler
+    from llm_cache import SQLiteLLMCache
+    from llm_pool import LLMClientPool
+    from tracing import NodeTracer, record_throttle
+    from semantic_cache import SemanticCache
 
-set_llm_cache(InMemoryCache())
+logger = logging.getLogger(__name__)
+
+# Persistent response cache shared by every session and worker process on this machine, opened by install_llm_cache()
+llm_cache: Optional[SQLiteLLMCache] = None
+_llm_cache_lock = threading.Lock()
+
+def install_llm_cache() -> SQLiteLLMCache:
+    """Open the response cache at LLM_CACHE_PATH and make it langchain's global cache, once per process."""
+    global llm_cache
+    with _llm_cache_lock:
+        if llm_cache is None:
+            llm_cache = SQLiteLLMCache(os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite"))
+            set_llm_cache(llm_cache)
+    return llm_cache
+
+# "<agent> message  : <timestamp> -" header that create_message puts in front of every message
+_MESSAGE_HEADER = re.compile(r"^\S+ message\s*:\s*\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} -\s*")
+
+def message_text(message: Any) -> str:
+    """Content of ``message`` without the create_message header, whose timestamp differs every time."""
+    content = message.content if isinstance(getattr(message, "content", None), str) else str(message)
+    return _MESSAGE_HEADER.sub("", content, count=1).strip()
 
 # Load the LLM models from the JSON file
 with open(Path("Data/llm_models.json"), "r") as f:
@@ -46,6 +77,99 @@ NVIDIA_MODELS = LLM_MODELS["NVIDIA_MODELS"]
 ANTHROPIC_MODELS = LLM_MODELS["ANTHROPIC_MODELS"]
 FIREWORKS_MODELS = LLM_MODELS["FIREWORKS_MODELS"]
 
+# Maximum number of in-flight async LLM calls per provider
+PROVIDER_CONCURRENCY = LLM_MODELS.get("PROVIDER_CONCURRENCY", {})
+DEFAULT_PROVIDER_CONCURRENCY = 4
+
+# Every LLM call waits on the token bucket of its (provider, model) before hitting the API
+rate_limit_scheduler = RateLimitScheduler(LLM_MODELS.get("RATE_LIMITS", {}))
+
+# Seconds a tool call may take before the assistant gets a timeout error instead; "default" covers unlisted tools
+TOOL_TIMEOUTS = LLM_MODELS.get("TOOL_TIMEOUTS", {})
+
+# Per-node latency, token and cost records, the file opened on first use; TRACE_PATH=off disables them
+node_tracer = NodeTracer(prices=LLM_MODELS.get("MODEL_PRICES", {}), path=os.getenv("TRACE_PATH", ".cache/traces.sqlite"))
+
+# asyncio semaphores are bound to the loop they are first awaited on, so keep one set per loop
+_provider_semaphores = weakref.WeakKeyDictionary()
+
+# Chat model class of each provider: (module, class name, keyword receiving the model name).
+# Provider packages are heavy, so a module is only imported when one of its models is first used.
+LLM_PROVIDERS = {
+    "OPENAI": ("langchain_openai", "ChatOpenAI", "model_name"),
+    "MISTRAL": ("langchain_mistralai", "ChatMistralAI", "model"),
+    "COHERE": ("langchain_cohere", "ChatCohere", "model"),
+    "GROQ": ("langchain_groq", "ChatGroq", "model"),
+    "VERTEXAI": ("langchain_google_vertexai", "ChatVertexAI", "model_name"),
+    "OLLAMA": ("langchain_community.chat_models", "ChatOllama", "model"),
+    "NVIDIA": ("langchain_nvidia_ai_endpoints", "ChatNVIDIA", "model"),
+    "ANTHROPIC": ("langchain_anthropic", "ChatAnthropic", "model"),
+    "FIREWORKS": ("langchain_fireworks", "ChatFireworks", "model"),
+}
+# Providers whose chat model takes an httpx ``http_client``, so its models can share one keep-alive pool
+HTTP_CLIENT_PROVIDERS = {"OPENAI", "GROQ"}
+_provider_classes: Dict[str, type] = {}
+
+# Agents configured with the same provider, model and params share one client
+llm_client_pool = LLMClientPool()
+_provider_lock = threading.Lock()
+
+SEMANTIC_CACHE_MODEL = os.getenv("SEMANTIC_CACHE_MODEL", "text-embedding-3-small")
+
+def _semantic_cache_embeddings():
+    """OpenAIEmbeddings of the semantic cache, on the shared OpenAI connection pool."""
+    def build():
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings(model=SEMANTIC_CACHE_MODEL, http_client=llm_client_pool.http_client("OPENAI"))
+    return llm_client_pool.get("OPENAI", SEMANTIC_CACHE_MODEL, {"embeddings": True}, build)
+
+# Assistant answers reused for near-duplicate research questions asked in the same context, across meetings.
+# Off unless SEMANTIC_CACHE=on: each lookup costs an embedding call (rate limited like the OpenAI models).
+semantic_cache = None if os.getenv("SEMANTIC_CACHE", "off") != "on" else SemanticCache(
+    model=SEMANTIC_CACHE_MODEL,
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+    ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL", 24 * 3600)),
+    max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000")),
+    build_embeddings=_semantic_cache_embeddings,
+    rate_limiter=rate_limit_scheduler.limiter_for("OPENAI", SEMANTIC_CACHE_MODEL),
+)
+
+def register_provider(provider: str, module: str, class_name: str, model_kwarg: str = "model", models: Optional[List[str]] = None) -> None:
+    """Add (or replace) a provider, optionally together with the models it serves."""
+    with _provider_lock:
+        LLM_PROVIDERS[provider] = (module, class_name, model_kwarg)
+        _provider_classes.pop(provider, None)
+    if models is not None:
+        LLM_MODELS[f"{provider}_MODELS"] = list(models)
+
+def get_chat_model_class(provider: str) -> type:
+    """Import the chat model class of ``provider`` on first use and cache it."""
+    cls = _provider_classes.get(provider)
+    if cls is not None:
+        return cls
+    with _provider_lock:
+        if provider not in _provider_classes:
+            module, class_name, _ = LLM_PROVIDERS[provider]
+            try:
+                _provider_classes[provider] = getattr(importlib.import_module(module), class_name)
+            except ImportError as e:
+                raise ImportError(f"Provider {provider} needs the {module} package: {e}") from e
+        return _provider_classes[provider]
+
+def get_llm_provider(llm_name: str) -> str:
+    """Return the provider key (e.g. "OPENAI") for a model listed in llm_models.json."""
+    for key, models in LLM_MODELS.items():
+        if key.endswith("_MODELS") and llm_name in models:
+            return key[:-len("_MODELS")]
+    raise ValueError(f"Unsupported model: {llm_name}")
+
+def get_provider_semaphore(provider: str) -> asyncio.Semaphore:
+    """Return the semaphore bounding concurrent async calls to ``provider`` on the running loop."""
+    semaphores = _provider_semaphores.setdefault(asyncio.get_running_loop(), {})
+    if provider not in semaphores:
+        semaphores[provider] = asyncio.Semaphore(PROVIDER_CONCURRENCY.get(provider, DEFAULT_PROVIDER_CONCURRENCY))
+    return semaphores[provider]
+
 class BaseAgent:
     def __init__(
         self,
@@ -62,39 +186,88 @@ class BaseAgent:
         self.name = name
         self.tools = tools
         self.llm = self._construct_llm(llm, llm_params)
-        self.assistant_llm = self._construct_llm(assistant_llm, assistant_llm_params)
+        # The assistant researches with the agent's tools; its tool calls run in the agent's tools node
+        self.assistant_llm = self._construct_llm(assistant_llm, assistant_llm_params, tools)
+        self.llm_provider = get_llm_provider(llm)
+        self.assistant_llm_provider = get_llm_provider(assistant_llm)
+        self.assistant_llm_name = assistant_llm
         self.system_message = system_message
         self.debug = debug
         self.kwargs = kwargs
+        self._structured_llms: Dict[Type[BaseModel], Runnable] = {}
 
     def _construct_llm(self, llm_name: str, llm_params: Dict[str, Any], tools: List[BaseTool] = None) -> BaseLanguageModel:
         """Construct the appropriate LLM based on the input string and parameters."""
-        if llm_name in OPENAI_MODELS:
-            llm = ChatOpenAI(model_name=llm_name, **llm_params)
-        elif llm_name in MISTRAL_MODELS:
-            llm = ChatMistralAI(model=llm_name, **llm_params)
-        elif llm_name in COHERE_MODELS:
-            llm = ChatCohere(model=llm_name, **llm_params)
-        elif llm_name in GROQ_MODELS:
-            llm = ChatGroq(model=llm_name, **llm_params)
-        elif llm_name in VERTEXAI_MODELS:
-            llm = ChatVertexAI(model_name=llm_name, **llm_params)
-        elif llm_name in OLLAMA_MODELS:
-            llm = ChatOllama(model=llm_name, **llm_params)
-        elif llm_name in NVIDIA_MODELS:
-            llm = ChatNVIDIA(model=llm_name, **llm_params)
-        elif llm_name in ANTHROPIC_MODELS:
-            llm = ChatAnthropic(model=llm_name, **llm_params)
-        elif llm_name in FIREWORKS_MODELS:
-            llm = ChatFireworks(model=llm_name, **llm_params)
-        else:
-            raise ValueError(f"Unsupported model: {llm_name}")
+        provider = get_llm_provider(llm_name)
+
+        def build() -> BaseLanguageModel:
+            params = {
+                "rate_limiter": rate_limit_scheduler.limiter_for(provider, llm_name),
+                **llm_params,
+            }
+            if provider in HTTP_CLIENT_PROVIDERS and "http_client" not in params:
+                params["http_client"] = llm_client_pool.http_client(provider)
+            model_kwarg = LLM_PROVIDERS[provider][2]
+            return get_chat_model_class(provider)(**{model_kwarg: llm_name}, **params)
+
+        llm = llm_client_pool.get(provider, llm_name, llm_params, build)
         
         if tools:
-            return llm.bind_tools(self.tools)
+            try:
+                return llm.bind_tools(tools)
+            except NotImplementedError:
+                logger.warning(f"{llm_name} does not support tool calling; {self.name} answers without tools")
 
         return llm
 
+    def structured_llm(self, schema: Type[BaseModel]) -> Runnable:
+        """Return ``self.llm.with_structured_output(schema)``, built once per schema and reused."""
+        runnable = self._structured_llms.get(schema)
+        if runnable is None:
+            runnable = self._structured_llms[schema] = self.llm.with_structured_output(schema)
+        return runnable
+
+    async def ainvoke_llm(self, runnable: Runnable, input: Any, provider: Optional[str] = None) -> Any:
+        """Await ``runnable.ainvoke(input)`` while holding a concurrency slot for its provider."""
+        semaphore = get_provider_semaphore(provider or self.llm_provider)
+        waiting_since = time.perf_counter()
+        async with semaphore:
+            record_throttle(time.perf_counter() - waiting_since)
+            return await runnable.ainvoke(input)
+
+    def _semantic_key(self, question: Any, context: Dict[str, Any]) -> tuple:
+        # Answers are shared by assistants of the same kind and model whose prompt, apart from the
+        # question, renders the same (same template, company knowledge, digest...)
+        prompt = self.render_prompt('assistant_prompt.j2', question="", **context)
+        fingerprint = hashlib.sha256(prompt.encode()).hexdigest()[:16]
+        return f"{type(self).__name__}:{self.assistant_llm_name}:{fingerprint}", message_text(question)
+
+    def cached_answer(self, question: Any, **context: Any) -> Optional[AIMessage]:
+        """The semantic cache's answer to a question like ``question`` asked with the same assistant prompt ``context``."""
+        if semantic_cache is None or question is None:
+            return None
+        answer = semantic_cache.lookup(*self._semantic_key(question, context))
+        return AIMessage(content=answer) if answer is not None else None
+
+    async def acached_answer(self, question: Any, **context: Any) -> Optional[AIMessage]:
+        if semantic_cache is None or question is None:
+            return None
+        answer = await semantic_cache.alookup(*self._semantic_key(question, context))
+        return AIMessage(content=answer) if answer is not None else None
+
+    def remember_answer(self, question: Any, response: Any, **context: Any) -> None:
+        """Store a final answer (not a request for tools) under ``question`` and its prompt ``context``."""
+        if semantic_cache is not None and question is not None and not getattr(response, "tool_calls", None):
+            semantic_cache.update(*self._semantic_key(question, context), response.content)
+
+    async def aremember_answer(self, question: Any, response: Any, **context: Any) -> None:
+        if semantic_cache is not None and question is not None and not getattr(response, "tool_calls", None):
+            await semantic_cache.aupdate(*self._semantic_key(question, context), response.content)
+
+    def render_prompt(self, template: str, **context: Any) -> str:
+        """Render one of this agent's templates from the shared prompt registry."""
+        return self.prompts.render(f"{self.template_dir}/{template}", **context)
+
     # Old version of create_message not working properly
     def create_message_old_version(self, content, agent_name: str = None) -> AIMessage:
         """Dynamically create a new message class for a specific agent."""
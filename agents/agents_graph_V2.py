@@ -1,13 +1,14 @@
-from typing import List, Optional, Dict, Any, Union, Callable, Sequence, Literal, Type, get_origin, get_args
+from typing import List, Optional, Dict, Any, Union, Callable, Sequence, Literal, Type, AsyncIterator, Iterator, get_origin, get_args
 from typing_extensions import Annotated, TypedDict
 from langchain_core.language_models import BaseLanguageModel
 from langchain_core.tools import BaseTool
-from langchain_core.messages import BaseMessage, AIMessage, SystemMessage, HumanMessage
+from langchain_core.messages import BaseMessage, AIMessage, SystemMessage, HumanMessage, ToolMessage
 from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
 from pydantic import BaseModel, create_model, Field
 from pydantic import BaseModel, Field
 from langchain.schema.runnable import Runnable
+from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables.config import ContextThreadPoolExecutor
 from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.store.base import BaseStore
@@ -19,27 +20,40 @@ import os
 import operator
 from langgraph.graph.message import add_messages
 from langchain_community.tools import DuckDuckGoSearchRun
-from jinja2 import Environment, FileSystemLoader
-from langchain_openai import ChatOpenAI
 from langchain.globals import set_llm_cache
-from langchain_community.cache import InMemoryCache
-from langchain_core.messages import trim_messages
 from langgraph.graph import START, MessagesState, StateGraph
 from datetime import datetime
 from dotenv import load_dotenv
 import os
-from langchain_openai import ChatOpenAI
 import json
+import asyncio
+import hashlib
 import logging
+import sys
+import threading
+import uuid
 import time  # Add this at the top with other imports
 try:
-    from .agent_base import BaseAgent
+    from .agent_base import BaseAgent, node_tracer, install_llm_cache, message_text, TOOL_TIMEOUTS
+    from .tracing import record_speculation
+    from .tool_node import ParallelToolNode, split_tool_round, DEFAULT_TOOL_TIMEOUT
+    from .checkpoint_store import PooledSqliteSaver
+    from .token_window import IncrementalTrimmer
+    from .prompt_registry import get_prompt_registry
+    from .message_archive import MessageArchive, archive_marker, make_marker
 except:
-    from agent_base import BaseAgent    
+    from agent_base import BaseAgent, node_tracer, install_llm_cache, message_text, TOOL_TIMEOUTS
+    from tracing import record_speculation
+    from tool_node import ParallelToolNode, split_tool_round, DEFAULT_TOOL_TIMEOUT
+    from checkpoint_store import PooledSqliteSaver
+    from token_window import IncrementalTrimmer
+    from prompt_registry import get_prompt_registry
+    from message_archive import MessageArchive, archive_marker, make_marker
 
 
 # Set the logging level for the SageMaker SDK to WARNING or higher
 def setup_logging():
+    os.makedirs("logs", exist_ok=True)
     log_filename = f"logs/agent_graph_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
     logging.basicConfig(
         level=logging.INFO,
@@ -66,11 +80,59 @@ def pydantic_to_json(pydantic_obj):
     formatted_string = json.dumps(obj_dict, indent=4)
     return formatted_string
 
+# Runs the speculative assistant calls of sync executive nodes next to their decision call
+_speculation_pool = ContextThreadPoolExecutor(max_workers=8, thread_name_prefix="speculative-research")
+
 def keep_last_n(existing: List, updates: List) -> List:
     """Keep only the last n items from the combined list."""
     combined = existing + updates
     return combined[-5:]
 
+def keep_last_n_tool_rounds(existing: List, updates: List) -> List:
+    """keep_last_n for assistant conversations: the window never starts inside a tool round.
+
+    A round is a question, the assistant message asking for tools and one result per
+    call; with many parallel calls it outgrows five messages, and cutting it would
+    leave tool results without their request (rejected by the API) or lose the
+    question. The window then reaches back to the round's question.
+    """
+    combined = existing + updates
+    start = max(len(combined) - 5, 0)
+    while start > 0 and isinstance(combined[start], ToolMessage):
+        start -= 1
+    if start > 0 and isinstance(combined[start], AIMessage) and combined[start].tool_calls:
+        start -= 1
+    return combined[start:]
+
+def windowed(channel: str, window: int, archive: Optional[MessageArchive] = None,
+             transcript: bool = False, messages: bool = True) -> Callable[[List, List], List]:
+    """Reducer keeping the last ``window`` items of ``channel``, like keep_last_n but lossless.
+
+    Messages are merged with add_messages (plain lists are concatenated), then the
+    overflow is appended to ``archive`` and replaced by a single marker at the head
+    of the list that points to it; with ``transcript`` the marker also carries a
+    truncated transcript (one snippet per archived message, newest 2000
+    characters). State and checkpoint size stay O(window) however long the
+    meeting runs. The archive ignores a spill it already holds, so re-running the
+    reducer on a retry or replay doesn't archive the messages twice.
+    """
+    def reduce(existing: List, updates: List) -> List:
+        combined = add_messages(existing, updates) if messages else list(existing) + list(updates)
+        marker = combined[0] if archive_marker(combined) else None
+        items = combined[1:] if marker is not None else combined
+        if len(items) <= window:
+            return combined
+        dropped, kept = items[:-window], items[-window:]
+        previous_offset = archive_marker([marker])["offset"] if marker is not None else None
+        offset = archive.append(channel, dropped, prev=previous_offset) if archive else None
+        return [make_marker(channel, marker, dropped, offset, transcript)] + kept
+    reduce.__name__ = f"windowed_{channel}"
+    return reduce
+
+def with_transcript(channel: str, window: int, archive: Optional[MessageArchive] = None) -> Callable[[List, List], List]:
+    """windowed() whose marker keeps a truncated transcript of the archived messages."""
+    return windowed(channel, window, archive, transcript=True)
+
 def keep_last_item(existing: List, updates: List) -> List:
     """Keep only the last item from the combined list."""
     combined = existing + updates
@@ -78,7 +140,31 @@ def keep_last_item(existing: List, updates: List) -> List:
 def keep_last_elem(existing, updates) -> List:
     return updates
 
-def prepare_messages_agent(messages: List[BaseMessage], agent_name: str) -> str:
+def sync_async_node(func, afunc):
+    """Wrap a node so the graph runs ``func`` under invoke and ``afunc`` under ainvoke.
+
+    Both are traced by node_tracer: one latency/token/cost record per node run.
+    """
+    return RunnableLambda(node_tracer.wrap(func), afunc=node_tracer.awrap(afunc), name=func.__name__)
+
+def tools_node(tools: List[BaseTool], messages_key: str, agent_name: str) -> RunnableLambda:
+    """Node running the tool calls found at the end of ``messages_key`` concurrently, with TOOL_TIMEOUTS."""
+    node = ParallelToolNode(tools, messages_key, name=agent_name, timeouts=TOOL_TIMEOUTS,
+                            default_timeout=TOOL_TIMEOUTS.get("default", DEFAULT_TOOL_TIMEOUT))
+    return sync_async_node(node.tools_node, node.atools_node)
+
+def add_join(workflow: StateGraph, arrivals: List[str], target: str) -> None:
+    """Run ``target`` exactly once, in the step after the last of ``arrivals`` has run.
+
+    Each branch routes to its own no-op arrival node; a single barrier edge from all
+    arrival nodes to ``target`` replaces polling loops, so waiting for slower
+    branches costs no graph steps and no checkpoints.
+    """
+    for arrival in arrivals:
+        workflow.add_node(arrival, lambda state: {"empty_channel": 1})
+    workflow.add_edge(arrivals, target)
+
+def prepare_messages_agent(messages: List[BaseMessage], trimmer: IncrementalTrimmer) -> List[BaseMessage]:
     return trimmer.invoke(messages)
 
 ##########################################################################################
@@ -101,9 +187,11 @@ class Level1Decision(BaseModel):
 
 
 
-# Define trimmer
-# count each message as 1 "token" (token_counter=len) and keep only the last two messages
-trimmer = trim_messages(strategy="last", max_tokens=5000, token_counter=ChatOpenAI(model="gpt-4o"), allow_partial=True)
+# Token budget of the conversation history shown to an agent, unless its config.json sets max_context_tokens
+DEFAULT_MAX_CONTEXT_TOKENS = 5000
+
+# Messages kept in each shared conversation channel of the graph state
+DEFAULT_HISTORY_WINDOW = 40
 
 
 
@@ -111,15 +199,17 @@ class Level1Agent(BaseAgent):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.supervisor_name = kwargs.get('supervisor_name')
+        # Prefetch an assistant answer while deciding, kept only if the decision is to research
+        self.speculative_research = kwargs.get('speculative_research', False)
 
         self.state_schema = self._create_dynamic_state_schema()
         self.attr_mapping = self._create_attr_mapping()
         self.prompt_dir = os.path.join(kwargs.get('prompt_dir', ''), 'level1', self.name)
-        self.jinja_env = Environment(loader=FileSystemLoader(self.prompt_dir))
-        system_prompt_template = self.jinja_env.get_template('system_prompt.j2')
-        self.system_prompt = system_prompt_template.render(tools=self.tools)
+        self.prompts = get_prompt_registry(kwargs.get('prompt_dir', ''))
+        self.template_dir = f"level1/{self.name}"
+        self.system_prompt = self.render_prompt('system_prompt.j2', tools=self.tools)
         self.system_message = SystemMessage(content=self.system_prompt)
-        self.trimmer = trimmer
+        self.trimmer = IncrementalTrimmer(kwargs.get('max_context_tokens', DEFAULT_MAX_CONTEXT_TOKENS))
         self.logger = logging.getLogger(f"{self.__class__.__name__}_{self.name}")
 
     def create_message(self, content: str, agent_name: str = None, mode: str = None):
@@ -132,21 +222,17 @@ class Level1Agent(BaseAgent):
             return HumanMessage(content=f"""{agent_name} message  : {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - 
                                 {content}""")
     
-    def level1_node(self, state):
-        self.logger.info(f"Executing level1_node for {self.name}")
-        
-
-
+    def _decision_messages(self, state):
         conversation = self.get_attr(state, "meeting_simulation")
-        trimmed_conversation = prepare_messages_agent(conversation, self.name)
+        trimmed_conversation = prepare_messages_agent(conversation, self.trimmer)
         assistant_conversation = self.get_attr(state, "assistant_conversation")
         try :
-            trimmed_assistant_conversation = prepare_messages_agent(assistant_conversation, self.name)
+            trimmed_assistant_conversation = prepare_messages_agent(assistant_conversation, self.trimmer)
         except :
             trimmed_assistant_conversation = assistant_conversation
         # Trim messages before rendering the decision prompt
 
-        decision_prompt = self.jinja_env.get_template('decision_prompt.j2').render(
+        decision_prompt = self.render_prompt('decision_prompt.j2',
             conversation=trimmed_conversation,
             assistant_conversation=trimmed_assistant_conversation,
             tools=self.tools
@@ -154,10 +240,9 @@ class Level1Agent(BaseAgent):
         
         # Use the decision prompt
         message = HumanMessage(content=decision_prompt)
+        return [self.system_prompt, message]
 
-        structured_llm = self.llm.with_structured_output(Level1Decision)
-        response = structured_llm.invoke([self.system_prompt, message])
-
+    def _decision_update(self, response: Level1Decision):
         if self.debug:
             print(f"Reasoning: {response.reasoning}")
             print(f"Decision: {response.decision}")
@@ -170,7 +255,7 @@ class Level1Agent(BaseAgent):
         resp = self.create_message(content=pydantic_to_json(response))
 
         if response.decision == "search_more_information":
-            return { f"{self.name}_assistant_conversation": [response.content],
+            return { f"{self.name}_assistant_conversation": [self.create_message(content=content_str)],
                      f"{self.name}_mode": ["research"],
                      f"meeting_simulation": [resp]
                     }
@@ -180,42 +265,179 @@ class Level1Agent(BaseAgent):
                      f"meeting_simulation": [resp]
             }
 
+    def level1_node(self, state):
+        self.logger.info(f"Executing level1_node for {self.name}")
+        structured_llm = self.structured_llm(Level1Decision)
+        question = self._speculative_question(state) if self.speculative_research else None
+        speculation = _speculation_pool.submit(self.assistant_llm.invoke, self._assistant_messages([question])) if question is not None else None
+        response = structured_llm.invoke(self._decision_messages(state))
+        update = self._decision_update(response)
+        if speculation is None:
+            return update
+        if not self._asks(update, question):
+            speculation.cancel()
+            return self._discard_speculation(update)
+        try:
+            return self._use_speculation(update, speculation.result(), question)
+        except Exception as e:
+            self.logger.warning(f"Speculative research failed: {e}")
+            return self._discard_speculation(update)
+
+    async def alevel1_node(self, state):
+        self.logger.info(f"Executing alevel1_node for {self.name}")
+        structured_llm = self.structured_llm(Level1Decision)
+        speculation = question = None
+        if self.speculative_research:
+            question = self._speculative_question(state)
+            speculation = asyncio.ensure_future(self.ainvoke_llm(self.assistant_llm, self._assistant_messages([question]), self.assistant_llm_provider))
+            # A discarded prefetch may still fail; don't let asyncio report it as unhandled
+            speculation.add_done_callback(lambda task: task.cancelled() or task.exception())
+        try:
+            response = await self.ainvoke_llm(structured_llm, self._decision_messages(state))
+        except BaseException:
+            if speculation is not None:
+                speculation.cancel()
+            raise
+        update = self._decision_update(response)
+        if speculation is None:
+            return update
+        if not self._asks(update, question):
+            speculation.cancel()
+            return self._discard_speculation(update)
+        try:
+            return self._use_speculation(update, await speculation, question)
+        except Exception as e:
+            self.logger.warning(f"Speculative research failed: {e}")
+            return self._discard_speculation(update)
+
+    def _speculative_question(self, state):
+        """Guess of the next research question: the executive's last one, or the news insight before the first one."""
+        question = next((message for message in reversed(self.get_attr(state, "assistant_conversation"))
+                         if isinstance(message, HumanMessage) and message.content.startswith(f"{self.name} message")), None)
+        if question is None:
+            insights = self.get_attr(state, "news_insights")
+            question = self.create_message(content=insights[-1] if insights else "")
+        return question
+
+    def _asks(self, update, question):
+        """Whether the decision in ``update`` is to research exactly ``question`` (headers and spacing aside)."""
+        asked = update.get(f"{self.name}_assistant_conversation")
+        if not asked:
+            return False
+        return " ".join(message_text(asked[-1]).split()) == " ".join(message_text(question).split())
+
+    def _use_speculation(self, update, response, question):
+        """Append the prefetched answer after the new question; route_decision then skips assistant_{name}."""
+        record_speculation(True)
+        key = f"{self.name}_assistant_conversation"
+        answer = self._assistant_update(response)[key][0]
+        if not getattr(answer, "tool_calls", None):
+            answer.additional_kwargs["speculative"] = True
+            # The question the answer was prefetched for, so a mismatch would show in the state
+            answer.additional_kwargs["speculative_question"] = message_text(question)
+        return {**update, key: [*update[key], answer]}
+
+    def _discard_speculation(self, update):
+        record_speculation(False)
+        return update
+
+    def route_decision(self, state):
+        """Next node after the decision: its mode, or the tools/agent node when research was prefetched."""
+        mode = self.get_attr(state, "mode")
+        mode = mode[-1] if mode else "converse"
+        if mode == "research":
+            last_message = self.get_attr(state, "assistant_conversation")[-1]
+            if getattr(last_message, "tool_calls", None):
+                return "tools"
+            if last_message.additional_kwargs.get("speculative"):
+                return "researched"
+        return mode
+
+    def _start_research_session(self, assistant_conversation):
+        # Initialize with a default message if empty
+        assistant_conversation.append(HumanMessage(
+            content="Starting research session. As your assistant, I'm here to help gather information, analyze data, and provide insights to support your decision-making process. What specific information would you like me to research?"
+        ))
+        return {f"{self.name}_assistant_conversation": [assistant_conversation[-1]]}
+
+    def _assistant_messages(self, assistant_conversation):
+        # After a tool round the model also gets its tool calls and their results
+        question, tool_round = split_tool_round(assistant_conversation)
+        return [self.create_message(content=self.render_prompt('assistant_prompt.j2', question=question)), *tool_round]
+
+    def _assistant_update(self, response):
+        if getattr(response, "tool_calls", None):
+            # Kept as is so should_continue sends it to tools_{name}
+            return {f"{self.name}_assistant_conversation": [response]}
+        response = self.create_message(response.content, agent_name=f"assistant_{self.name}")
+        return {f"{self.name}_assistant_conversation": [response]}
+
+    def _assistant_error_update(self, error):
+        self.logger.error(f"Error in assistant_node: {error}")
+        # Return a safe default response
+        default_response = self.create_message("I apologize, but I encountered an error processing the request.", 
+                                             agent_name=f"assistant_{self.name}")
+        return {f"{self.name}_assistant_conversation": [default_response]}
+
     def assistant_node(self, state) -> Dict[str, Any]:
         self.logger.info(f"Executing assistant_node for {self.name}")
         
-        prompt = self.jinja_env.get_template('assistant_prompt.j2')
-
         # Safety check: ensure assistant_conversation exists and has messages
         assistant_conversation = self.get_attr(state, "assistant_conversation")
         if not assistant_conversation:
-            # Initialize with a default message if empty
-            assistant_conversation.append(HumanMessage(
-                content="Starting research session. As your assistant, I'm here to help gather information, analyze data, and provide insights to support your decision-making process. What specific information would you like me to research?"
-            ))
-            return {f"{self.name}_assistant_conversation": [assistant_conversation[-1]]}
+            return self._start_research_session(assistant_conversation)
 
         try:
             last_message = assistant_conversation[-1]
             print(f"Processing question from {self.name}: {last_message.content}")
-            assistant_message = self.create_message(content=prompt.render(question=last_message))
+            question, tool_round = split_tool_round(assistant_conversation)
+            # A near-duplicate question answered before skips the call (and its tools)
+            cached = self.cached_answer(question) if not tool_round else None
+            if cached is not None:
+                return self._assistant_update(cached)
+            assistant_messages = self._assistant_messages(assistant_conversation)
             
             try:
-                response = self.assistant_llm.invoke(assistant_message)
+                response = self.assistant_llm.invoke(assistant_messages)
             except Exception as e:
                 self.logger.warning(f"Error invoking assistant_llm with message: {e}")
-                response = self.assistant_llm.invoke(f"Question from executive: {last_message}.")
+                response = self.assistant_llm.invoke([HumanMessage(content=f"Question from executive: {last_message.content}.")])
                 self.logger.info(f"assistant answer: {response}")
 
-            response = self.create_message(pydantic_to_json(response), agent_name=f"assistant_{self.name}")
+            self.remember_answer(question, response)
+            return self._assistant_update(response)
+        
+        except Exception as e:
+            return self._assistant_error_update(e)
+
+    async def aassistant_node(self, state) -> Dict[str, Any]:
+        self.logger.info(f"Executing aassistant_node for {self.name}")
+        
+        assistant_conversation = self.get_attr(state, "assistant_conversation")
+        if not assistant_conversation:
+            return self._start_research_session(assistant_conversation)
+
+        try:
+            last_message = assistant_conversation[-1]
+            print(f"Processing question from {self.name}: {last_message.content}")
+            question, tool_round = split_tool_round(assistant_conversation)
+            cached = await self.acached_answer(question) if not tool_round else None
+            if cached is not None:
+                return self._assistant_update(cached)
+            assistant_messages = self._assistant_messages(assistant_conversation)
             
-            return {f"{self.name}_assistant_conversation": [response]}
+            try:
+                response = await self.ainvoke_llm(self.assistant_llm, assistant_messages, self.assistant_llm_provider)
+            except Exception as e:
+                self.logger.warning(f"Error invoking assistant_llm with message: {e}")
+                response = await self.ainvoke_llm(self.assistant_llm, [HumanMessage(content=f"Question from executive: {last_message.content}.")], self.assistant_llm_provider)
+                self.logger.info(f"assistant answer: {response}")
+
+            await self.aremember_answer(question, response)
+            return self._assistant_update(response)
         
         except Exception as e:
-            self.logger.error(f"Error in assistant_node: {e}")
-            # Return a safe default response
-            default_response = self.create_message("I apologize, but I encountered an error processing the request.", 
-                                                 agent_name=f"assistant_{self.name}")
-            return {f"{self.name}_assistant_conversation": [default_response]}
+            return self._assistant_error_update(e)
 
     def should_continue(self, state):
         try:
@@ -287,13 +509,13 @@ class Level2Agent(BaseAgent):
         super().__init__(*args, **kwargs)
         self.state_schema = self._create_dynamic_state_schema()
         self.prompt_dir = os.path.join(kwargs.get('prompt_dir', ''), 'level2', self.name)
-        self.jinja_env = Environment(loader=FileSystemLoader(self.prompt_dir))
+        self.prompts = get_prompt_registry(kwargs.get('prompt_dir', ''))
+        self.template_dir = f"level2/{self.name}"
         self.subordinates = kwargs.get('subordinates', [])
-        system_prompt_template = self.jinja_env.get_template('system_prompt.j2')
-        self.system_prompt = system_prompt_template.render(tools=self.tools)
+        self.system_prompt = self.render_prompt('system_prompt.j2', tools=self.tools)
         self.system_message = SystemMessage(content=self.system_prompt)
         self.attr_mapping = self._create_attr_mapping()
-        self.trimmer = trimmer
+        self.trimmer = IncrementalTrimmer(kwargs.get('max_context_tokens', DEFAULT_MAX_CONTEXT_TOKENS))
         self.logger = logging.getLogger(f"{self.__class__.__name__}_{self.name}")
     
     def create_message(self, content: str, agent_name: str = None):
@@ -303,25 +525,21 @@ class Level2Agent(BaseAgent):
         return HumanMessage(content=f"""{agent_name} message  : {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - 
                                 {content}""")
     
-    def level2_supervisor_node(self, state):
-
-
+    def _decision_messages(self, state):
         conversation = self.get_attr(state, "meeting_simulation")
         try :
-            trimmed_conversation = prepare_messages_agent(conversation, self.name)
+            trimmed_conversation = prepare_messages_agent(conversation, self.trimmer)
         except :
             trimmed_conversation = conversation
 
 
-        decision_prompt = self.jinja_env.get_template('decision_prompt.j2').render(
+        decision_prompt = self.render_prompt('decision_prompt.j2',
             meeting_simulation=trimmed_conversation,
             subordinates_list=self.subordinates
         )
-        
-        structured_llm = self.llm.with_structured_output(Level2Decision)
-        response = structured_llm.invoke([self.system_message, HumanMessage(content=decision_prompt)])
-
+        return [self.system_message, HumanMessage(content=decision_prompt)]
 
+    def _decision_update(self, response: Level2Decision):
         if self.debug:
             print(f"Reasoning: {response.reasoning}")
             print(f"Decision: {response.decision}")
@@ -343,8 +561,16 @@ class Level2Agent(BaseAgent):
                         f"{self.name}_mode": ["break_down_for_executives"],
                         f"{self.name}_messages": [message]
             }
-            
 
+    def level2_supervisor_node(self, state):
+        structured_llm = self.structured_llm(Level2Decision)
+        response = structured_llm.invoke(self._decision_messages(state))
+        return self._decision_update(response)
+
+    async def alevel2_supervisor_node(self, state):
+        structured_llm = self.structured_llm(Level2Decision)
+        response = await self.ainvoke_llm(structured_llm, self._decision_messages(state))
+        return self._decision_update(response)
 
     def should_continue(self, state) -> Literal["aggregate_for_ceo", "break_down_for_executives"]:
         current_mode = self.get_attr(state, "mode")
@@ -414,12 +640,12 @@ class Level3Agent(BaseAgent):
         super().__init__(*args, **kwargs)
         self.state_schema = Level3State
         self.prompt_dir = os.path.join(kwargs.get('prompt_dir', ''), 'level3', self.name)
-        self.jinja_env = Environment(loader=FileSystemLoader(self.prompt_dir))
+        self.prompts = get_prompt_registry(kwargs.get('prompt_dir', ''))
+        self.template_dir = f"level3/{self.name}"
         # Generate the system prompt once during initialization
-        system_prompt_template = self.jinja_env.get_template('system_prompt.j2')
-        self.system_prompt = system_prompt_template.render()
+        self.system_prompt = self.render_prompt('system_prompt.j2')
         self.system_message = SystemMessage(content=self.system_prompt)
-        self.trimmer = trimmer
+        self.trimmer = IncrementalTrimmer(kwargs.get('max_context_tokens', DEFAULT_MAX_CONTEXT_TOKENS))
         self.logger = logging.getLogger(f"{self.__class__.__name__}_{self.name}")
 
     def create_message(self, content: str, agent_name: str = None, mode: str = None):
@@ -432,22 +658,23 @@ class Level3Agent(BaseAgent):
         elif mode == "write_to_digest":
             return HumanMessage(content=f"""{agent_name} message  : {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - 
                                 writing to digest: {content}""")
-        elif mode == "communicate_with_directors" or mode == "communicate_with_executives":
-            return HumanMessage(content=f"""{agent_name} message  : {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - 
+        elif mode == "end":
+            return HumanMessage(content=f"""{agent_name} message  : {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} -
+                                ending the meeting: {content}""")
+        # communicate_with_directors / communicate_with_executives, and prompts built without a mode
+        return HumanMessage(content=f"""{agent_name} message  : {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} -
                                 {content}""")
-    
-    def ceo_node(self, state) -> Dict[str, Any]:
-        state.ceo_runs_counter += 1
 
+    def _decision_messages(self, state):
         meeting_simulation = state.meeting_simulation
-        trimmed_meeting_simulation = prepare_messages_agent(meeting_simulation, self.name)
+        trimmed_meeting_simulation = prepare_messages_agent(meeting_simulation, self.trimmer)
         assistant_conversation = state.ceo_assistant_conversation
         try : 
             trimmed_assistant_conversation = self.trimmer.invoke(assistant_conversation)
         except :
             trimmed_assistant_conversation = assistant_conversation
 
-        decision_prompt = self.jinja_env.get_template('decision_prompt.j2').render(
+        decision_prompt = self.render_prompt('decision_prompt.j2',
             news_insights=state.news_insights,
             meeting_simulation=trimmed_meeting_simulation,
             assistant_conversation=trimmed_assistant_conversation,
@@ -455,10 +682,9 @@ class Level3Agent(BaseAgent):
             company_knowledge=state.company_knowledge
         )
         
-        trimmed_ceo_messages = self.trimmer.invoke([self.system_message, HumanMessage(content=decision_prompt, type="human", name=self.name)])
-        structured_llm = self.llm.with_structured_output(CEODecision)
-        response = structured_llm.invoke(trimmed_ceo_messages)
+        return self.trimmer.invoke([self.system_message, HumanMessage(content=decision_prompt, type="human", name=self.name)])
 
+    def _decision_update(self, response: CEODecision):
         # Convert the list of strings to a single string
         response.content = " ".join(response.content)
 
@@ -497,35 +723,89 @@ class Level3Agent(BaseAgent):
             return { f"ceo_mode": ["end"],
                      f"meeting_simulation": [message]
             }
+
+    def ceo_node(self, state) -> Dict[str, Any]:
+        structured_llm = self.structured_llm(CEODecision)
+        response = structured_llm.invoke(self._decision_messages(state))
+        # Returned rather than set on the state, which langgraph would not persist
+        return {**self._decision_update(response), "ceo_runs_counter": state.ceo_runs_counter + 1}
+
+    async def aceo_node(self, state) -> Dict[str, Any]:
+        structured_llm = self.structured_llm(CEODecision)
+        response = await self.ainvoke_llm(structured_llm, self._decision_messages(state))
+        # Returned rather than set on the state, which langgraph would not persist
+        return {**self._decision_update(response), "ceo_runs_counter": state.ceo_runs_counter + 1}
+
+    def _start_advisory_session(self, state):
+        state.ceo_assistant_conversation.append(HumanMessage(
+            content="Starting CEO advisory session. As your executive assistant, I'm here to help research market trends, analyze company data, and provide strategic insights. I have access to company knowledge and can help synthesize information for decision-making. What would you like me to analyze first?"
+        ))
+        return {"ceo_assistant_conversation": [state.ceo_assistant_conversation[-1]]}
+
+    def _assistant_messages(self, state):
+        # After a tool round the model also gets its tool calls and their results
+        question, tool_round = split_tool_round(state.ceo_assistant_conversation)
         
+        # Create and render the prompt
+        prompt_content = self.render_prompt('assistant_prompt.j2',
+            question=question,
+            company_knowledge=state.company_knowledge,
+            digest=state.digest
+        )
+        return [self.create_message(content=prompt_content), *tool_round]
+
+    def _assistant_update(self, response):
+        if response.tool_calls:
+            # Kept as is so should_continue_assistant sends it to ceo_tool
+            return {"ceo_assistant_conversation": [response]}
+        return {"ceo_assistant_conversation": [AIMessage(content=response.content)]}
 
     def assistant_node(self, state) -> Dict[str, Any]:
         try:
             # Initialize conversation if empty
             if not state.ceo_assistant_conversation:
-                state.ceo_assistant_conversation.append(HumanMessage(
-                    content="Starting CEO advisory session. As your executive assistant, I'm here to help research market trends, analyze company data, and provide strategic insights. I have access to company knowledge and can help synthesize information for decision-making. What would you like me to analyze first?"
-                ))
-                return {"ceo_assistant_conversation": [state.ceo_assistant_conversation[-1]]}
-
-            prompt = self.jinja_env.get_template('assistant_prompt.j2')
-            last_message = state.ceo_assistant_conversation[-1]
-            
-            # Create and render the prompt
-            prompt_content = prompt.render(
-                question=last_message,
-                company_knowledge=state.company_knowledge,
-                digest=state.digest
-            )
+                return self._start_advisory_session(state)
+
+            question, tool_round = split_tool_round(state.ceo_assistant_conversation)
+            # A near-duplicate question answered before skips the call (and its tools)
+            cached = self.cached_answer(question, company_knowledge=state.company_knowledge, digest=state.digest) if not tool_round else None
+            if cached is not None:
+                return self._assistant_update(cached)
+            assistant_messages = self._assistant_messages(state)
             
             # Invoke the assistant
             try:
-                response = self.assistant_llm.invoke(self.create_message(content=prompt_content))
+                response = self.assistant_llm.invoke(assistant_messages)
+                self.remember_answer(question, response, company_knowledge=state.company_knowledge, digest=state.digest)
+            except Exception as e:
+                self.logger.warning(f"Error invoking assistant_llm: {e}")
+                response = AIMessage(content="I apologize, but I encountered an error processing your request.")
+            
+            return self._assistant_update(response)
+            
+        except Exception as e:
+            self.logger.error(f"Error in assistant_node: {e}")
+            return {"ceo_assistant_conversation": [AIMessage(content="I apologize, but I encountered an error.")]}
+
+    async def aassistant_node(self, state) -> Dict[str, Any]:
+        try:
+            if not state.ceo_assistant_conversation:
+                return self._start_advisory_session(state)
+
+            question, tool_round = split_tool_round(state.ceo_assistant_conversation)
+            cached = await self.acached_answer(question, company_knowledge=state.company_knowledge, digest=state.digest) if not tool_round else None
+            if cached is not None:
+                return self._assistant_update(cached)
+            assistant_messages = self._assistant_messages(state)
+            
+            try:
+                response = await self.ainvoke_llm(self.assistant_llm, assistant_messages, self.assistant_llm_provider)
+                await self.aremember_answer(question, response, company_knowledge=state.company_knowledge, digest=state.digest)
             except Exception as e:
                 self.logger.warning(f"Error invoking assistant_llm: {e}")
-                response = "I apologize, but I encountered an error processing your request."
+                response = AIMessage(content="I apologize, but I encountered an error processing your request.")
             
-            return {"ceo_assistant_conversation": [AIMessage(content=response)]}
+            return self._assistant_update(response)
             
         except Exception as e:
             self.logger.error(f"Error in assistant_node: {e}")
@@ -572,42 +852,51 @@ class Level3Agent(BaseAgent):
 ##########################################################################################
 
 class StateMachines():
-    def __init__(self, prompt_dir, interrupt_graph_before = True):
+    def __init__(self, prompt_dir, interrupt_graph_before = True, checkpoint_path = None, history_window = None, archive_path = None,
+                 department_subgraphs = False, speculative_research = False):
         self.logger = logging.getLogger(__name__)
         self.interrupt_graph_before = interrupt_graph_before
-        
-        def from_conn_stringx(cls, conn_string: str,) -> "SqliteSaver":
-            return SqliteSaver(conn=sqlite3.connect(conn_string, check_same_thread=False))
-        SqliteSaver.from_conn_stringx=classmethod(from_conn_stringx)
+        # Run each department as its own subgraph so graph steps cost O(departments), not O(agents)
+        self.department_subgraphs = department_subgraphs
+        # Executives prefetch assistant research while they decide (see Level1Agent.level1_node)
+        self.speculative_research = speculative_research
+        # Conversation channels keep this many messages; older ones are archived and paged from the UI
+        self.history_window = history_window or int(os.getenv("HISTORY_WINDOW", DEFAULT_HISTORY_WINDOW))
+        self.archive = MessageArchive(archive_path or os.getenv("MEETING_ARCHIVE_PATH", ".cache/meeting_archive.jsonl"))
 
         from dotenv import load_dotenv
         load_dotenv()
-        self.memory = SqliteSaver.from_conn_stringx(":memory:")
+        # Agents' model calls go through the persistent response cache
+        install_llm_cache()
+        # Checkpoints live on disk so long meetings don't grow RAM and threads survive restarts
+        self.memory = PooledSqliteSaver(checkpoint_path or os.getenv("CHECKPOINT_DB_PATH", ".cache/checkpoints.sqlite"))
         self.prompt_dir = prompt_dir
         self.final_graph , self.unified_state_schema = self._create_agents_graph()
         self.config = {
             "recursion_limit": 50, 
             "configurable":{
-                "thread_id": "2",
+                # Checkpoints persist across runs, so never reuse a fixed default thread
+                "thread_id": self.new_thread_id(),
             }
         }
 
-    def _create_unified_state_schema(self, level1_agents, level2_agents, ceo_agent):
-        unified_fields = {
+    def _shared_fields(self):
+        """Channels of the whole meeting: the cross-level conversations and the CEO's state."""
+        return {
             "meeting_simulation": (
-                Annotated[List, add_messages], 
+                Annotated[List, with_transcript("meeting_simulation", self.history_window, self.archive)],
                 Field(default_factory=lambda: [HumanMessage(
                     content="Starting strategic alignment meeting between executives, directors and CEO. "
                 )])
             ),
             "level2_3_conversation": (
-                Annotated[List, add_messages], 
+                Annotated[List, with_transcript("level2_3_conversation", self.history_window, self.archive)],
                 Field(default_factory=lambda: [HumanMessage(
                     content="Starting strategic alignment meeting between directors and CEO. Directors will consolidate department reports and receive strategic guidance."
                 )])
             ),
             "level1_3_conversation": (
-                Annotated[List, add_messages], 
+                Annotated[List, with_transcript("level1_3_conversation", self.history_window, self.archive)],
                 Field(default_factory=lambda: [HumanMessage(
                     content="Starting executive briefing with CEO. Executives will share departmental insights and receive strategic direction."
                 )])
@@ -619,7 +908,7 @@ class StateMachines():
                 )])
             ),
             "ceo_assistant_conversation": (
-                Annotated[List, keep_last_n], 
+                Annotated[List, keep_last_n_tool_rounds], 
                 Field(default_factory=lambda: [HumanMessage(
                     content="Starting CEO advisory session. Ready to assist with market research, data analysis, and strategic insights compilation."
                 )])
@@ -637,7 +926,7 @@ class StateMachines():
                 Field(default_factory=list)
             ),
             "digest": (
-                Annotated[List[str], operator.add],
+                Annotated[List[str], windowed("digest", self.history_window, self.archive, messages=False)],
                 Field(default_factory=list)
             ),
             "ceo_runs_counter": (
@@ -650,46 +939,82 @@ class StateMachines():
             )
         }
 
-        # Add default modes for all agents
-        for agent in level1_agents:
-            unified_fields[f"{agent.name}_mode"] = (
+    def _level1_fields(self, agent):
+        """Channels private to one executive."""
+        return {
+            f"{agent.name}_mode": (
                 Annotated[List[Literal["research", "converse"]], keep_last_item],
                 Field(default_factory=lambda: ["research"])
-            )
-            unified_fields[f"{agent.name}_assistant_conversation"] = (
-                Annotated[List, keep_last_n],
+            ),
+            f"{agent.name}_assistant_conversation": (
+                Annotated[List, keep_last_n_tool_rounds],
                 Field(default_factory=lambda: [HumanMessage(
                     content=f"Starting research session for {agent.name}. Ready to assist with information gathering and analysis to support executive decision-making."
                 )])
-            )
-            unified_fields[f"{agent.name}_messages"] = (
+            ),
+            f"{agent.name}_messages": (
                 Annotated[List, keep_last_n],
                 Field(default_factory=lambda: [HumanMessage(content="")])
-            )
-            unified_fields[f"{agent.name}_domain_knowledge"] = (
+            ),
+            f"{agent.name}_domain_knowledge": (
                 Annotated[List[str], operator.add],
                 Field(default_factory=list)
-            )
+            ),
+        }
 
-        for agent in level2_agents:
-            unified_fields[f"{agent.name}_mode"] = (
+    def _level2_fields(self, agent):
+        """Channels private to one director and its department."""
+        return {
+            f"{agent.name}_mode": (
                 Annotated[List[Literal["aggregate_for_ceo", "break_down_for_executives"]], keep_last_item],
                 Field(default_factory=lambda: ["break_down_for_executives"])
-            )
-            unified_fields[f"{agent.name}_messages"] = (
+            ),
+            f"{agent.name}_messages": (
                 Annotated[List, keep_last_n],
                 Field(default_factory=lambda: [HumanMessage(content="")])
-            )
-            unified_fields[f"{agent.name}_level1_2_conversation"] = (
-                Annotated[List, add_messages],
+            ),
+            f"{agent.name}_level1_2_conversation": (
+                Annotated[List, with_transcript(f"{agent.name}_level1_2_conversation", self.history_window, self.archive)],
                 Field(default_factory=lambda: [HumanMessage(
                     content=f"Starting departmental coordination meeting. Executives will report to their directors {agent.name} for guidance and alignment."
                 )])
-            )
+            ),
+        }
+
+    def _create_unified_state_schema(self, level1_agents, level2_agents, ceo_agent):
+        unified_fields = self._shared_fields()
+        for agent in level1_agents:
+            unified_fields.update(self._level1_fields(agent))
+        for agent in level2_agents:
+            unified_fields.update(self._level2_fields(agent))
 
         UnifiedState = create_model("UnifiedState", **unified_fields, __base__=BaseModel)
         return UnifiedState
 
+    def _create_department_state_schema(self, l2_agent, executives):
+        """State of one department subgraph: its director's and executives' channels plus the meeting.
+
+        meeting_simulation only accumulates here; the department node hands the new
+        messages to the parent graph, whose reducer windows and archives them.
+        """
+        fields = {
+            "meeting_simulation": (Annotated[List, operator.add], Field(default_factory=list)),
+            "empty_channel": (Annotated[int, keep_last_elem], Field(default_factory=lambda: 1)),
+            # Read only: speculative research starts from it
+            "news_insights": (Annotated[List[str], keep_last_item], Field(default_factory=list)),
+            **self._level2_fields(l2_agent),
+        }
+        for agent in executives:
+            fields.update(self._level1_fields(agent))
+        return create_model(f"{l2_agent.name}_DepartmentState", **fields, __base__=BaseModel)
+
+    def _create_parent_state_schema(self, level2_agents):
+        """Top-level state in department mode: one opaque channel per department instead of its agents' channels."""
+        fields = self._shared_fields()
+        for agent in level2_agents:
+            fields[f"{agent.name}_department_state"] = (Annotated[Dict[str, Any], keep_last_elem], Field(default_factory=dict))
+        return create_model("DepartmentsState", **fields, __base__=BaseModel)
+
     def _get_agent_names(self, level):
         base_path = os.path.join(self.prompt_dir, f'level{level}')
         return [name for name in os.listdir(base_path) if os.path.isdir(os.path.join(base_path, name))]
@@ -713,6 +1038,7 @@ class StateMachines():
             llm_params=ceo_config['llm_config'],
             assistant_llm=ceo_config['assistant_llm_model'],
             assistant_llm_params=ceo_config['assistant_llm_config'],
+            max_context_tokens=ceo_config.get('max_context_tokens', DEFAULT_MAX_CONTEXT_TOKENS),
             tools=tools,
             debug=debug,
             prompt_dir=self.prompt_dir
@@ -728,6 +1054,7 @@ class StateMachines():
                 llm_params=level2_config['llm_config'],
                 assistant_llm=level2_config['assistant_llm_model'],
                 assistant_llm_params=level2_config['assistant_llm_config'],
+                max_context_tokens=level2_config.get('max_context_tokens', DEFAULT_MAX_CONTEXT_TOKENS),
                 tools=tools,
                 debug=debug,
                 subordinates=level2_config.get('subordinates', []),
@@ -745,52 +1072,33 @@ class StateMachines():
                 llm_params=level1_config['llm_config'],
                 assistant_llm=level1_config['assistant_llm_model'],
                 assistant_llm_params=level1_config['assistant_llm_config'],
+                max_context_tokens=level1_config.get('max_context_tokens', DEFAULT_MAX_CONTEXT_TOKENS),
                 tools=tools,
                 debug=debug,
                 supervisor_name=level1_config.get('supervisor_name', ''),
+                speculative_research=self.speculative_research,
                 prompt_dir=self.prompt_dir
             )
             level1_agents.append(level1_agent)
 
-        # After creating all your agents, use this function to create the unified state schema
-        unified_state_schema = self._create_unified_state_schema(level1_agents, level2_agents, ceo_agent)
+        if self.department_subgraphs:
+            state_schema = self._create_parent_state_schema(level2_agents)
+        else:
+            # After creating all your agents, use this function to create the unified state schema
+            state_schema = self._create_unified_state_schema(level1_agents, level2_agents, ceo_agent)
 
-        workflow = StateGraph(unified_state_schema)
-        workflow.add_node("ceo", ceo_agent.ceo_node)
-        workflow.add_node("ceo_assistant", ceo_agent.assistant_node)
-        workflow.add_node("ceo_tool", ToolNode)
+        workflow = StateGraph(state_schema)
+        workflow.add_node("ceo", sync_async_node(ceo_agent.ceo_node, ceo_agent.aceo_node))
+        workflow.add_node("ceo_assistant", sync_async_node(ceo_agent.assistant_node, ceo_agent.aassistant_node))
+        workflow.add_node("ceo_tool", tools_node(ceo_agent.tools, "ceo_assistant_conversation", ceo_agent.name))
         workflow.set_entry_point("ceo")
 
-        def create_ceo_router_up(level2_agents):
-            def ceo_router_up(state):
-                return "complete" if all([getattr(state, f"{l2_agent.name}_mode")[-1] == "aggregate_for_ceo" for l2_agent in level2_agents]) else "continue"
-            return ceo_router_up
-        
-        def ceo_router_up_node(state):
-            logging.info("CEO Router Up Node - Processing")
-            time.sleep(5)  # Add 2-second delay
-            return {"empty_channel": 1}
-        
-        workflow.add_node("ceo_router_up", ceo_router_up_node)
-        
         def ceo_router_down(state):
             logging.info("CEO Router Down - Processing")
-            time.sleep(2)  # Add 2-second delay
             return {"empty_channel": 1}
 
         workflow.add_node("ceo_router_down" , ceo_router_down  )
 
-        for l1_agent in level1_agents:
-
-            tool_node = ToolNode(l1_agent.tools)
-            workflow.add_node(f"agent_{l1_agent.name}", l1_agent.level1_node)
-            workflow.add_node(f"assistant_{l1_agent.name}", l1_agent.assistant_node)
-            workflow.add_node(f"tools_{l1_agent.name}", tool_node)
-
-        for l2_agent in level2_agents:
-            # Add Level 2 agent node
-            workflow.add_node(f"{l2_agent.name}_supervisor", l2_agent.level2_supervisor_node)
-
         workflow.add_node("END", lambda state: {"empty_channel": 1})
         # Add conditional edges based on the should_continue function
         workflow.add_conditional_edges(
@@ -817,150 +1125,156 @@ class StateMachines():
 
         workflow.add_edge("ceo_tool", "ceo_assistant")
 
-        for l2_agent in level2_agents:
-
-            workflow.add_edge("ceo_router_down", f"{l2_agent.name}_supervisor")
-
-
-            router_name_down = f"{l2_agent.name}_router_down"
+        if self.department_subgraphs:
+            # Each department is one node of the top-level graph, so a step only
+            # schedules the CEO and the departments, whatever the size of the org
+            for l2_agent in level2_agents:
+                executives = [l1_agent for l1_agent in level1_agents if l1_agent.name in l2_agent.subordinates]
+                department = StateGraph(self._create_department_state_schema(l2_agent, executives))
+                self._add_department(department, l2_agent, executives, END)
+                department.set_entry_point(f"{l2_agent.name}_supervisor")
+                # Departments run inside one step of the parent; only the parent checkpoints
+                department_graph = department.compile(checkpointer=False)
+                workflow.add_node(f"{l2_agent.name}_department", self._department_node(l2_agent, executives, department_graph))
+                workflow.add_edge("ceo_router_down", f"{l2_agent.name}_department")
+            # The CEO runs once every department has reported
+            workflow.add_edge([f"{l2_agent.name}_department" for l2_agent in level2_agents], "ceo")
+            interrupts = [f"{l2_agent.name}_department" for l2_agent in level2_agents]
+        else:
+            for l2_agent in level2_agents:
+                executives = [l1_agent for l1_agent in level1_agents if l1_agent.name in l2_agent.subordinates]
+                self._add_department(workflow, l2_agent, executives, f"{l2_agent.name}_ready")
+                workflow.add_edge("ceo_router_down", f"{l2_agent.name}_supervisor")
+            # The CEO runs once every director has aggregated its report
+            add_join(workflow, [f"{l2_agent.name}_ready" for l2_agent in level2_agents], "ceo")
+            interrupts = [
+                #"ceo",
+                *[f"{l2_agent.name}_supervisor" for l2_agent in level2_agents],
+                *[f"agent_{l1_agent.name}" for l1_agent in level1_agents]
+            ]
 
-            def create_level2_router_down(agent_name):
-                def level2_router(state):
-                    logging.info(f"{agent_name} Router Down - Processing")
-                    time.sleep(15)  # Add 2-second delay
-                    return {"empty_channel": 1}
-                level2_router.__name__ = f"{agent_name}_router_down"
-                return level2_router
+        # Compile the main graph
+        if self.interrupt_graph_before:
+            final_graph = workflow.compile(
+                checkpointer=self.memory,
+                interrupt_before=interrupts
+            )
+        else:
+            final_graph = workflow.compile(
+                checkpointer=self.memory,
+            )
         
-            router_function_down = create_level2_router_down(l2_agent.name)
+        self.logger.info("Agents graph created successfully")
 
-            workflow.add_node(router_name_down, router_function_down)
+        return final_graph , state_schema
 
-            router_name_up = f"{l2_agent.name}_router_up"
+    def _add_department(self, workflow: StateGraph, l2_agent, executives, done: str) -> None:
+        """Director and executive nodes of one department; the director routes to ``done`` once it aggregates."""
+        workflow.add_node(f"{l2_agent.name}_supervisor", sync_async_node(l2_agent.level2_supervisor_node, l2_agent.alevel2_supervisor_node))
 
-            def create_level2_router_up(agent_name, subordinates):
-                def level2_router(state):
-                    logging.info(f"agents modes are {[getattr(state, f'{sub}_mode')[-1] for sub in subordinates]}")
-                    return "complete" if all([getattr(state, f"{sub}_mode")[-1] == "converse" 
-                                              for sub in subordinates]) else "continue"
-                level2_router.__name__ = f"{agent_name}_router_up"
-                return level2_router
-            
-            def create_level2_router_up_node(agent_name):
-                def level2_router_node(state):
-                    logging.info(f"{agent_name} Router Up Node - Processing")
-                    time.sleep(5)  # Add 2-second delay
-                    return {"empty_channel": 1}
-                level2_router_node.__name__ = f"{agent_name}_router_up"
-                return level2_router_node
-
-            router_function_up = create_level2_router_up(l2_agent.name, l2_agent.subordinates)
-            router_node_up = create_level2_router_up_node(l2_agent.name)
-            
-            #workflow.add_node(router_name_up, router_node_up)
+        router_name_down = f"{l2_agent.name}_router_down"
 
+        def create_level2_router_down(agent_name):
+            def level2_router(state):
+                logging.info(f"{agent_name} Router Down - Processing")
+                return {"empty_channel": 1}
+            level2_router.__name__ = f"{agent_name}_router_down"
+            return level2_router
 
-            
-            for l1_agent in level1_agents :
-                if l1_agent.name in l2_agent.subordinates:
-                    workflow.add_edge(router_name_down , f"agent_{l1_agent.name}")
-
-                    waiter_node_name = f"{l1_agent.name}_waiter"
-                    workflow.add_node(waiter_node_name, lambda state: {"empty_channel": 1})
-
-                    workflow.add_conditional_edges(
-                    f"agent_{l1_agent.name}",
-                    #lambda s: "assistant" if l1_agent.get_attr(s, "mode")[-1] == "research" else "router",
-                    lambda state: l1_agent.get_attr(state, "mode")[-1] if l1_agent.get_attr(state, "mode") else "converse",
-                        {
-                            "research" : f"assistant_{l1_agent.name}",
-                            "converse": waiter_node_name
-                        }
-                    )
-                    workflow.add_conditional_edges(f"assistant_{l1_agent.name}", l1_agent.should_continue,
-                    {
-                    # If `tools`, then we call the tool node.
-                        "continue": f"tools_{l1_agent.name}",
-                    # Otherwise we finish.
-                        "executive_agent" : f"agent_{l1_agent.name}",
-                    }, 
-                    )
-                    workflow.add_edge(f"tools_{l1_agent.name}", f"assistant_{l1_agent.name}")
-
-            workflow.add_edge([f"{l1_agent_name}_waiter" for l1_agent_name in l2_agent.subordinates], f"{l2_agent.name}_supervisor")
-            # Add conditional edges for the router
-            
-            #workflow.add_conditional_edges(
-            #    router_name_up,
-            #    router_function_up,
-            #    {
-            #        "complete": f"{l2_agent.name}_supervisor",
-            #        "continue": router_name_up  # Loop back if not all subordinates are ready
-            #    }
-            #)
+        workflow.add_node(router_name_down, create_level2_router_down(l2_agent.name))
+
+        for l1_agent in executives:
+            workflow.add_node(f"agent_{l1_agent.name}", sync_async_node(l1_agent.level1_node, l1_agent.alevel1_node))
+            workflow.add_node(f"assistant_{l1_agent.name}", sync_async_node(l1_agent.assistant_node, l1_agent.aassistant_node))
+            workflow.add_node(f"tools_{l1_agent.name}", tools_node(l1_agent.tools, f"{l1_agent.name}_assistant_conversation", l1_agent.name))
+            workflow.add_edge(router_name_down , f"agent_{l1_agent.name}")
 
             workflow.add_conditional_edges(
-                f"{l2_agent.name}_supervisor",
-                l2_agent.should_continue,
-                            {
-                    "aggregate_for_ceo": "ceo_router_up",
-                    "break_down_for_executives": router_name_down  # Loop back if not all subordinates are ready
+                f"agent_{l1_agent.name}",
+                l1_agent.route_decision,
+                {
+                    "research" : f"assistant_{l1_agent.name}",
+                    "converse": f"{l1_agent.name}_waiter",
+                    # Speculative research already asked for tools or got its answer
+                    "tools": f"tools_{l1_agent.name}",
+                    "researched": f"agent_{l1_agent.name}",
                 }
+            )
+            workflow.add_conditional_edges(f"assistant_{l1_agent.name}", l1_agent.should_continue,
+                {
+                # If `tools`, then we call the tool node.
+                    "continue": f"tools_{l1_agent.name}",
+                # Otherwise we finish.
+                    "executive_agent" : f"agent_{l1_agent.name}",
+                },
+            )
+            workflow.add_edge(f"tools_{l1_agent.name}", f"assistant_{l1_agent.name}")
 
+        add_join(workflow, [f"{l1_agent.name}_waiter" for l1_agent in executives], f"{l2_agent.name}_supervisor")
 
-                
-            )
         workflow.add_conditional_edges(
-            "ceo_router_up",
-            create_ceo_router_up(level2_agents),
+            f"{l2_agent.name}_supervisor",
+            l2_agent.should_continue,
             {
-                "complete": "ceo",
-                "continue": "ceo_router_up"  # Loop back if not all subordinates are ready
+                "aggregate_for_ceo": done,
+                "break_down_for_executives": router_name_down
             }
         )
 
-                
-        # Compile the main graph
-        if self.interrupt_graph_before:
-            final_graph = workflow.compile(
-                checkpointer=self.memory,
-                interrupt_before=[
-                    #"ceo",
-                    *[f"{l2_agent.name}_supervisor" for l2_agent in level2_agents],
-                    *[f"agent_{l1_agent.name}" for l1_agent in level1_agents]
-            ]
-            )
-        else:
-            final_graph = workflow.compile(
-                checkpointer=self.memory,
-            )
-        
-        self.logger.info("Agents graph created successfully")
+    def _department_node(self, l2_agent, executives, department_graph) -> RunnableLambda:
+        """Top-level node running one department subgraph.
+
+        The department's own channels travel in and out of ``{director}_department_state``;
+        only the messages it added to meeting_simulation are handed back, so the
+        parent's reducer sees them exactly once.
+        """
+        channel = f"{l2_agent.name}_department_state"
+        private = list(self._level2_fields(l2_agent))
+        for l1_agent in executives:
+            private.extend(self._level1_fields(l1_agent))
+
+        def department_input(state):
+            return {"meeting_simulation": state.meeting_simulation, "news_insights": state.news_insights, **getattr(state, channel)}
+
+        def department_update(before, after):
+            return {
+                "meeting_simulation": after["meeting_simulation"][len(before["meeting_simulation"]):],
+                channel: {key: after[key] for key in private if key in after},
+            }
+
+        def department(state, config):
+            before = department_input(state)
+            return department_update(before, department_graph.invoke(before, config))
+
+        async def adepartment(state, config):
+            before = department_input(state)
+            return department_update(before, await department_graph.ainvoke(before, config))
 
-        return final_graph , unified_state_schema
+        department.__name__ = f"{l2_agent.name}_department"
+        return RunnableLambda(department, afunc=adepartment, name=department.__name__)
 
     def get_graph_image(self, name):   
         Image.open(io.BytesIO(self.final_graph.get_graph().draw_mermaid_png())).save(f'{name}.png')
     
-    def start(self, initial_state):
-        # Ensure recursion_limit is set before starting
-        if "recursion_limit" not in self.config:
-            self.config["recursion_limit"] = 50
-            
-        result = self.final_graph.invoke(initial_state, self.config)
-        if result is None:
-            values = self.final_graph.get_state(self.config).values
-            last_state = next(iter(values))
-            return values[last_state]
-        return result
-    
-    def resume(self, new_state: dict):
-        # Ensure recursion_limit is set before resuming
+    @staticmethod
+    def new_thread_id() -> str:
+        return uuid.uuid4().hex
+
+    def _ensure_recursion_limit(self):
         if "recursion_limit" not in self.config:
             self.config["recursion_limit"] = 50
-            
-        # Get the current state values
-        current_state = self.final_graph.get_state(self.config).values
+
+    def _thread_config(self, thread_id: Optional[str] = None):
+        """Config for ``thread_id``; the instance may be shared, so each session passes its own."""
+        if thread_id is None:
+            return self.config
+        return {**self.config, "configurable": {**self.config.get("configurable", {}), "thread_id": thread_id}}
+
+    def _last_state_value(self, values):
+        last_state = next(iter(values))
+        return values[last_state]
+
+    def _merge_new_state(self, current_state, new_state: dict):
         # Update the current state with new values from new_state
         if new_state:  # This checks if new_state is not empty
             state = {}
@@ -972,22 +1286,133 @@ class StateMachines():
                         state[key] = value
         else:
             state = current_state
+        return state
+
+    def start(self, initial_state, thread_id: Optional[str] = None):
+        # Ensure recursion_limit is set before starting
+        self._ensure_recursion_limit()
+        config = self._thread_config(thread_id)
+            
+        result = self.final_graph.invoke(initial_state, config)
+        if result is None:
+            return self._last_state_value(self.final_graph.get_state(config).values)
+        return result
+    
+    def resume(self, new_state: dict, thread_id: Optional[str] = None):
+        # Ensure recursion_limit is set before resuming
+        self._ensure_recursion_limit()
+        config = self._thread_config(thread_id)
+            
+        # Get the current state values
+        current_state = self.final_graph.get_state(config).values
+        state = self._merge_new_state(current_state, new_state)
 
         # Update the state in the graph
         if state != current_state:
-            self.final_graph.update_state(self.config, state)
+            self.final_graph.update_state(config, state)
         
         # Invoke the graph with the updated state
-        result = self.final_graph.invoke(None, self.config)
+        result = self.final_graph.invoke(None, config)
         
         if result is None:
             print("this is the result",result)
-            values = self.final_graph.get_state(self.config).values
-            last_state = next(iter(values))
-            return self.final_graph.get_state(self.config).values[last_state]
+            return self._last_state_value(self.final_graph.get_state(config).values)
         
         return result
 
+    async def astart(self, initial_state, thread_id: Optional[str] = None):
+        """Async counterpart of start: sibling executives under a supervisor run concurrently."""
+        self._ensure_recursion_limit()
+        config = self._thread_config(thread_id)
+
+        result = await self.final_graph.ainvoke(initial_state, config)
+        if result is None:
+            return self._last_state_value((await self.final_graph.aget_state(config)).values)
+        return result
+
+    async def aresume(self, new_state: dict, thread_id: Optional[str] = None):
+        """Async counterpart of resume."""
+        self._ensure_recursion_limit()
+        config = self._thread_config(thread_id)
+
+        current_state = (await self.final_graph.aget_state(config)).values
+        state = self._merge_new_state(current_state, new_state)
+
+        if state != current_state:
+            await self.final_graph.aupdate_state(config, state)
+
+        result = await self.final_graph.ainvoke(None, config)
+
+        if result is None:
+            return self._last_state_value((await self.final_graph.aget_state(config)).values)
+
+        return result
+
+    async def _astream_events(self, input, config) -> AsyncIterator[Dict[str, Any]]:
+        async for event in self.final_graph.astream_events(input, config, version="v2"):
+            node = event.get("metadata", {}).get("langgraph_node")
+            if node is None:
+                continue
+            kind = event["event"]
+            if kind == "on_chat_model_stream":
+                chunk = event["data"]["chunk"]
+                # Structured decisions arrive as tool call arguments rather than content
+                text = chunk.content if isinstance(chunk.content, str) else ""
+                text += "".join(tool_call.get("args") or "" for tool_call in getattr(chunk, "tool_call_chunks", []))
+                if text:
+                    yield {"type": "token", "node": node, "text": text}
+            elif event["name"] == node and kind == "on_chain_start":
+                yield {"type": "node_start", "node": node}
+            elif event["name"] == node and kind == "on_chain_end":
+                output = event["data"].get("output")
+                yield {"type": "node_end", "node": node, "update": output if isinstance(output, dict) else {}}
+        yield {"type": "state", "state": dict((await self.final_graph.aget_state(config)).values)}
+
+    async def astream_start(self, initial_state, thread_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Like astart, but yield events while the graph runs instead of blocking until the interrupt.
+
+        Events are dicts with a ``type``: ``node_start`` and ``node_end`` (with the
+        node's state ``update``) per graph node, ``token`` for every streamed LLM
+        chunk (``node``, ``text``), and a final ``state`` with the state values at
+        the interrupt or the end of the meeting.
+        """
+        self._ensure_recursion_limit()
+        async for event in self._astream_events(initial_state, self._thread_config(thread_id)):
+            yield event
+
+    async def astream_resume(self, new_state: dict, thread_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Streaming counterpart of aresume; yields the same events as astream_start."""
+        self._ensure_recursion_limit()
+        config = self._thread_config(thread_id)
+
+        current_state = (await self.final_graph.aget_state(config)).values
+        state = self._merge_new_state(current_state, new_state)
+        if state != current_state:
+            await self.final_graph.aupdate_state(config, state)
+
+        async for event in self._astream_events(None, config):
+            yield event
+
+    def _iterate_on_background_loop(self, events: AsyncIterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        loop = background_loop()
+        try:
+            while True:
+                try:
+                    event = asyncio.run_coroutine_threadsafe(events.__anext__(), loop).result()
+                except StopAsyncIteration:
+                    return
+                yield event
+        finally:
+            asyncio.run_coroutine_threadsafe(events.aclose(), loop).result()
+
+    def stream_start(self, initial_state, thread_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Blocking iterator over astream_start events, for sync callers such as Streamlit."""
+        return self._iterate_on_background_loop(self.astream_start(initial_state, thread_id))
+
+    def stream_resume(self, new_state: dict, thread_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Blocking iterator over astream_resume events."""
+        return self._iterate_on_background_loop(self.astream_resume(new_state, thread_id))
+
     def update_config(self, new_config: dict):
         """
         Update the current configuration with new values.
@@ -997,6 +1422,51 @@ class StateMachines():
         self.config.update(new_config)
         self.logger.info(f"Configuration updated: {self.config}")
 
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    """Process-wide event loop running on a daemon thread.
+
+    Sync callers drive async graph runs on this loop, so async LLM clients and
+    their connection pools always stay on the loop they were created on.
+    """
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, name="graph-event-loop", daemon=True).start()
+        return _background_loop
+
+def prompt_dir_fingerprint(prompt_dir: str) -> str:
+    """Hash of the path, size and mtime of every file under prompt_dir."""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(prompt_dir):
+        dirs.sort()
+        for file_name in sorted(files):
+            path = os.path.join(root, file_name)
+            stat = os.stat(path)
+            digest.update(f"{os.path.relpath(path, prompt_dir)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+_state_machines = {}
+_state_machines_lock = threading.Lock()
+
+def get_state_machine(prompt_dir: str, interrupt_graph_before: bool = True) -> StateMachines:
+    """Return a process-wide StateMachines for prompt_dir, rebuilt only when a prompt file changes.
+
+    The compiled graph is shared by every caller, so callers must keep their
+    conversations apart by passing their own thread_id to start/resume.
+    """
+    key = (os.path.abspath(prompt_dir), interrupt_graph_before)
+    fingerprint = prompt_dir_fingerprint(prompt_dir)
+    with _state_machines_lock:
+        cached = _state_machines.get(key)
+        if cached is None or cached[0] != fingerprint:
+            logging.getLogger(__name__).info(f"Building StateMachines for {prompt_dir} (interrupt_before={interrupt_graph_before})")
+            _state_machines[key] = (fingerprint, StateMachines(prompt_dir, interrupt_graph_before))
+        return _state_machines[key][1]
+
 if __name__ == "__main__":
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.INFO)
@@ -1027,7 +1497,8 @@ if __name__ == "__main__":
     logger.info("Starting graph execution...")
     result = state_machines.start(initial_state)
     
-    while result is not None:
+    # The graph stops at every interrupt; keep resuming until nothing is left to run
+    while state_machines.final_graph.get_state(state_machines.config).next:
         logger.info(f"Current state: {result}")
         # Here you can add logic to handle the current state and provide new values
         # For example:
@@ -0,0 +1,268 @@
+"""Run many independent meetings through one StateMachines instance.
+
+Every news insight gets its own meeting thread (and so its own checkpoints), while
+all threads share the compiled graph, the pooled LLM clients and the response
+cache. At most ``concurrency`` meetings run at once on one event loop.
+
+Run from the repository root:
+    python agents/batch_runner.py s3_links.json --concurrency 8 --report .cache/batch_report.json
+"""
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Union
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+try:
+    from .agents_graph_V2 import StateMachines, background_loop
+except:
+    from agents_graph_V2 import StateMachines, background_loop
+
+logger = logging.getLogger(__name__)
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Sums the token usage of every chat model call made during one meeting.
+
+    Responses served from the LLM cache report the usage of the original call,
+    so the totals measure the work of a meeting, not what was billed.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._lock = threading.Lock()
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        if not input_tokens and not output_tokens:
+            # Providers that only fill llm_output
+            token_usage = (response.llm_output or {}).get("token_usage") or {}
+            input_tokens = token_usage.get("prompt_tokens", 0)
+            output_tokens = token_usage.get("completion_tokens", 0)
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+
+    def usage(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "llm_calls": self.calls,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                "total_tokens": self.input_tokens + self.output_tokens,
+            }
+
+
+def initial_meeting_state(insight: str) -> Dict[str, Any]:
+    """The state a meeting starts from, as built by the Streamlit page for an uploaded document."""
+    return {
+        "news_insights": [insight],
+        "digest": [""],
+        "ceo_messages": [],
+        "ceo_mode": ["research_information"],
+    }
+
+
+def load_insight(source: str) -> str:
+    """Text of an insight source: a local file, an ``s3://`` object or the text itself.
+
+    JSON articles (as scraped to S3) contribute their ``article_body``.
+    """
+    if source.startswith("s3://"):
+        import boto3
+        bucket, _, key = source[len("s3://"):].partition("/")
+        content = boto3.client("s3").get_object(Bucket=bucket, Key=key)["Body"].read().decode("utf-8")
+    elif os.path.isfile(source):
+        with open(source, "r", encoding="utf-8") as f:
+            content = f.read()
+    else:
+        return source
+    if source.endswith(".json"):
+        try:
+            article = json.loads(content)
+        except json.JSONDecodeError:
+            return content
+        if isinstance(article, dict) and "article_body" in article:
+            return article["article_body"]
+    return content
+
+
+def expand_sources(paths: Iterable[str]) -> List[str]:
+    """Turn CLI arguments into insight sources; a JSON list (e.g. s3_links.json) expands to its entries."""
+    sources = []
+    for path in paths:
+        if path.endswith(".json") and os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, list):
+                sources.extend(str(item) for item in data)
+                continue
+        sources.append(path)
+    return sources
+
+
+class MeetingBatch:
+    """Runs one meeting per insight with at most ``concurrency`` meetings in flight.
+
+    Graphs compiled with interrupts are resumed automatically until the meeting
+    ends (at most ``max_resumes`` times). A failed meeting is recorded in its
+    result and does not stop the batch.
+    """
+
+    def __init__(
+        self,
+        state_machines: StateMachines,
+        concurrency: int = 4,
+        recursion_limit: Optional[int] = None,
+        max_resumes: int = 100,
+    ):
+        self.state_machines = state_machines
+        self.concurrency = concurrency
+        self.recursion_limit = recursion_limit
+        self.max_resumes = max_resumes
+
+    def _config(self, thread_id: str, callbacks: List[BaseCallbackHandler]) -> Dict[str, Any]:
+        self.state_machines._ensure_recursion_limit()
+        config = {**self.state_machines._thread_config(thread_id), "callbacks": callbacks}
+        if self.recursion_limit:
+            config["recursion_limit"] = self.recursion_limit
+        return config
+
+    async def arun_meeting(self, insight: str, source: Optional[str] = None, thread_id: Optional[str] = None) -> Dict[str, Any]:
+        """Run one meeting to its end and return its result record."""
+        thread_id = thread_id or self.state_machines.new_thread_id()
+        usage = TokenUsageCallback()
+        config = self._config(thread_id, [usage])
+        graph = self.state_machines.final_graph
+        result = {"source": source, "thread_id": thread_id}
+        start = time.perf_counter()
+        try:
+            await graph.ainvoke(initial_meeting_state(insight), config)
+            resumes = 0
+            snapshot = await graph.aget_state(config)
+            while snapshot.next and resumes < self.max_resumes:
+                await graph.ainvoke(None, config)
+                resumes += 1
+                snapshot = await graph.aget_state(config)
+            result.update({
+                "status": "interrupted" if snapshot.next else "completed",
+                "resumes": resumes,
+                "ceo_runs": snapshot.values.get("ceo_runs_counter", 0),
+                "digest": [entry for entry in snapshot.values.get("digest", []) if entry],
+            })
+        except Exception as e:
+            logger.error(f"Meeting {thread_id} ({source}) failed: {e}", exc_info=True)
+            result.update({"status": "failed", "error": f"{type(e).__name__}: {e}"})
+        result["seconds"] = time.perf_counter() - start
+        result.update(usage.usage())
+        return result
+
+    async def arun(
+        self,
+        sources: Iterable[Union[str, Dict[str, Any]]],
+        on_result: Optional[Callable[[Dict[str, Any]], Optional[Awaitable[None]]]] = None,
+    ) -> Dict[str, Any]:
+        """Run a meeting for every source and return the throughput report.
+
+        A source is a string for load_insight, or a record with an optional ``id``
+        and either the insight ``text`` or a ``source`` to load it from; the id is
+        copied into the result. ``on_result`` is called with each result as soon as
+        its meeting finishes.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = []
+
+        async def run(item: Union[str, Dict[str, Any]]) -> None:
+            record = item if isinstance(item, dict) else {"source": item}
+            source = record.get("source")
+            async with semaphore:
+                try:
+                    insight = record["text"] if "text" in record else await asyncio.to_thread(load_insight, source)
+                except Exception as e:
+                    logger.error(f"Could not load {source}: {e}")
+                    result = {"source": source, "status": "failed", "error": f"{type(e).__name__}: {e}", "seconds": 0.0}
+                else:
+                    result = await self.arun_meeting(insight, source)
+            if "id" in record:
+                result = {"id": record["id"], **result}
+            results.append(result)
+            logger.info(f"Meeting {len(results)} done: {source} ({result['status']}, {result['seconds']:.1f}s)")
+            if on_result is not None:
+                awaitable = on_result(result)
+                if awaitable is not None:
+                    await awaitable
+
+        start = time.perf_counter()
+        await asyncio.gather(*(run(source) for source in sources))
+        return self.report(results, time.perf_counter() - start)
+
+    def run(self, sources: Iterable[Union[str, Dict[str, Any]]], on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Blocking arun, driven on the shared background loop like the Streamlit page."""
+        return asyncio.run_coroutine_threadsafe(self.arun(list(sources), on_result), background_loop()).result()
+
+    def report(self, results: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+        return {**throughput_report(results, wall_seconds), "concurrency": self.concurrency, "results": results}
+
+
+def throughput_report(results: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    """Meetings/hour, meeting durations and token use of a finished batch."""
+    finished = [r for r in results if r["status"] != "failed"]
+    durations = sorted(r["seconds"] for r in finished)
+    tokens = [r.get("total_tokens", 0) for r in finished]
+    return {
+        "meetings": len(results),
+        "completed": sum(r["status"] == "completed" for r in results),
+        "interrupted": sum(r["status"] == "interrupted" for r in results),
+        "failed": len(results) - len(finished),
+        "wall_seconds": wall_seconds,
+        "meetings_per_hour": len(finished) * 3600 / wall_seconds if wall_seconds else 0.0,
+        "seconds_per_meeting": {
+            "mean": statistics.mean(durations) if durations else 0.0,
+            "p50": durations[len(durations) // 2] if durations else 0.0,
+            "p95": durations[min(len(durations) - 1, int(len(durations) * 0.95))] if durations else 0.0,
+        },
+        "tokens_per_meeting": statistics.mean(tokens) if tokens else 0.0,
+        "llm_calls_per_meeting": statistics.mean(r.get("llm_calls", 0) for r in finished) if finished else 0.0,
+        "total_tokens": sum(tokens),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one meeting per news insight and report throughput.")
+    parser.add_argument("sources", nargs="+", help="Insight files, s3:// URIs or JSON lists of them (e.g. s3_links.json)")
+    parser.add_argument("--prompt-dir", default="Data/Prompts")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--limit", type=int, default=None, help="Only run the first N sources")
+    parser.add_argument("--recursion-limit", type=int, default=250)
+    parser.add_argument("--report", default=".cache/batch_report.json")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    sources = expand_sources(args.sources)[:args.limit]
+    batch = MeetingBatch(
+        StateMachines(args.prompt_dir, interrupt_graph_before=False),
+        concurrency=args.concurrency,
+        recursion_limit=args.recursion_limit,
+    )
+    report = batch.run(sources)
+    if os.path.dirname(args.report):
+        os.makedirs(os.path.dirname(args.report), exist_ok=True)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+    logger.info(
+        f"{report['meetings']} meetings ({report['failed']} failed) in {report['wall_seconds']:.0f}s: "
+        f"{report['meetings_per_hour']:.1f} meetings/hour, {report['tokens_per_meeting']:.0f} tokens/meeting"
+    )
@@ -0,0 +1,422 @@
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+import asyncio
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import partial
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import WRITES_IDX_MAP, ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+logger = logging.getLogger(__name__)
+
+
+class ThreadedSqliteSaver(SqliteSaver):
+    """SqliteSaver that also serves the async checkpoint API.
+
+    The stock SqliteSaver raises NotImplementedError from its async methods, which
+    makes ``graph.ainvoke`` unusable. SQLite calls are short, so the async methods
+    simply run the sync implementation in the default executor; the connection must
+    be opened with ``check_same_thread=False``.
+    """
+
+    async def _run_sync(self, func, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(None, partial(func, *args, **kwargs))
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await self._run_sync(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await self._run_sync(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await self._run_sync(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        return await self._run_sync(self.put_writes, config, writes, task_id)
+
+
+class PooledSqliteSaver(ThreadedSqliteSaver):
+    """File-backed checkpointer safe to share between concurrent sessions.
+
+    - Connections come from a bounded pool, one per in-flight operation, instead
+      of a single connection behind a global lock. The database runs in WAL mode,
+      so readers never wait for the writer.
+    - Task writes are buffered in memory and stored together with the next
+      checkpoint of the same thread, in one transaction per super-step. Writes of
+      a step that crashes before its checkpoint is stored are lost, so those tasks
+      run again on resume.
+    - Only the ``keep_last`` newest checkpoints of each thread are kept, so the
+      database stays bounded over long meetings while the latest state survives
+      restarts.
+    - Checkpoints are stored as deltas: each channel value is a msgpack blob keyed
+      by (channel, version) and written only in the step that changed it, while
+      the checkpoint row itself keeps just the channel versions. A list channel
+      that only grew since its previous blob (a conversation) stores just the
+      appended items on top of that ``base_version``; every ``snapshot_every``
+      deltas a full value is written, so rebuilding a checkpoint
+      (``load_channel_values``) replays at most that many suffixes.
+    """
+
+    def __init__(
+        self,
+        database_path: str = ".cache/checkpoints.sqlite",
+        *,
+        pool_size: int = 8,
+        keep_last: Optional[int] = 20,
+        snapshot_every: int = 16,
+        max_tracked_channels: int = 4096,
+        serde: Optional[SerializerProtocol] = None,
+    ) -> None:
+        directory = os.path.dirname(database_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.database_path = database_path
+        self.keep_last = keep_last
+        self.snapshot_every = snapshot_every
+        self.max_tracked_channels = max_tracked_channels
+        self._local = threading.local()
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=pool_size)
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+        self._pending_writes: Dict[Tuple[str, str], List[tuple]] = {}
+        self._pending_lock = threading.Lock()
+        # Last list value stored per (thread, ns, channel): (version, items, deltas since the snapshot)
+        self._last_lists: "OrderedDict[Tuple[str, str, str], Tuple[str, list, int]]" = OrderedDict()
+        self._last_lists_lock = threading.Lock()
+        super().__init__(self._pool.queue[0], serde=serde)
+        self.setup()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.database_path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # SqliteSaver reads ``self.conn`` directly; point it at the connection checked
+    # out by the current thread
+    @property
+    def conn(self) -> sqlite3.Connection:
+        return getattr(self._local, "conn", None) or self._idle_conn
+
+    @conn.setter
+    def conn(self, value: sqlite3.Connection) -> None:
+        self._idle_conn = value
+
+    def setup(self) -> None:
+        if self.is_setup:
+            return
+        with self._checkout() as conn:
+            conn.executescript(
+                """
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL DEFAULT '',
+                    checkpoint_id TEXT NOT NULL,
+                    parent_checkpoint_id TEXT,
+                    type TEXT,
+                    checkpoint BLOB,
+                    metadata BLOB,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+                );
+                CREATE TABLE IF NOT EXISTS checkpoint_blobs (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL DEFAULT '',
+                    channel TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    blob BLOB,
+                    base_version TEXT,
+                    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+                );
+                CREATE TABLE IF NOT EXISTS writes (
+                    thread_id TEXT NOT NULL,
+                    checkpoint_ns TEXT NOT NULL DEFAULT '',
+                    checkpoint_id TEXT NOT NULL,
+                    task_id TEXT NOT NULL,
+                    idx INTEGER NOT NULL,
+                    channel TEXT NOT NULL,
+                    type TEXT,
+                    value BLOB,
+                    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+                );
+                """
+            )
+        self.is_setup = True
+
+    @contextmanager
+    def _checkout(self) -> Iterator[sqlite3.Connection]:
+        # Re-entrant: list() opens a second cursor while the first is still live
+        if getattr(self._local, "conn", None) is not None:
+            yield self._local.conn
+            return
+        conn = self._pool.get()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._pool.put(conn)
+
+    @contextmanager
+    def cursor(self, transaction: bool = True) -> Iterator[sqlite3.Cursor]:
+        with self._checkout() as conn:
+            cur = conn.cursor()
+            try:
+                yield cur
+                if transaction:
+                    conn.commit()
+            except BaseException:
+                if transaction:
+                    conn.rollback()
+                raise
+            finally:
+                cur.close()
+
+    def _take_pending_writes(self, thread_id: str, checkpoint_ns: str) -> List[tuple]:
+        with self._pending_lock:
+            return self._pending_writes.pop((thread_id, checkpoint_ns), [])
+
+    def _flush_pending_writes(self, cur: sqlite3.Cursor, rows: List[tuple]) -> None:
+        for replace, row in rows:
+            verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+            cur.execute(
+                f"{verb} INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+
+    def flush(self, config: Optional[RunnableConfig] = None) -> None:
+        """Store buffered writes now, for one thread or for all of them."""
+        if config is not None:
+            keys = [(str(config["configurable"]["thread_id"]), config["configurable"].get("checkpoint_ns", ""))]
+        else:
+            with self._pending_lock:
+                keys = list(self._pending_writes)
+        for thread_id, checkpoint_ns in keys:
+            rows = self._take_pending_writes(thread_id, checkpoint_ns)
+            if rows:
+                with self.cursor() as cur:
+                    self._flush_pending_writes(cur, rows)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        replace = all(w[0] in WRITES_IDX_MAP for w in writes)
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = str(config["configurable"]["checkpoint_ns"])
+        rows = [
+            (
+                replace,
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    str(config["configurable"]["checkpoint_id"]),
+                    task_id,
+                    WRITES_IDX_MAP.get(channel, idx),
+                    channel,
+                    *self.serde.dumps_typed(value),
+                ),
+            )
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        with self._pending_lock:
+            self._pending_writes.setdefault((thread_id, checkpoint_ns), []).extend(rows)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        channel_values = checkpoint["channel_values"]
+        # Only channels that changed in this step get a new blob; the row keeps the versions
+        type_, serialized_checkpoint = self.serde.dumps_typed({**checkpoint, "channel_values": {}})
+        serialized_metadata = self.jsonplus_serde.dumps(metadata)
+        blobs = [
+            (thread_id, checkpoint_ns, channel, str(version), *self._channel_blob(thread_id, checkpoint_ns, channel, str(version), channel_values))
+            for channel, version in new_versions.items()
+        ]
+        rows = self._take_pending_writes(thread_id, checkpoint_ns)
+        with self.cursor() as cur:
+            self._flush_pending_writes(cur, rows)
+            cur.executemany(
+                "INSERT OR REPLACE INTO checkpoint_blobs (thread_id, checkpoint_ns, channel, version, type, blob, base_version) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                blobs,
+            )
+            cur.execute(
+                "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    type_,
+                    serialized_checkpoint,
+                    serialized_metadata,
+                ),
+            )
+            if self.keep_last:
+                self._prune(cur, thread_id, checkpoint_ns)
+        return {
+            "configurable": {
+                "thread_id": config["configurable"]["thread_id"],
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def _channel_blob(self, thread_id: str, checkpoint_ns: str, channel: str, version: str, channel_values: Dict[str, Any]) -> Tuple[str, Optional[bytes], Optional[str]]:
+        """Serialize one changed channel as ``(type, blob, base_version)``; base_version is set for suffix deltas."""
+        key = (thread_id, checkpoint_ns, channel)
+        if channel not in channel_values:
+            with self._last_lists_lock:
+                self._last_lists.pop(key, None)
+            return "empty", None, None
+        value = channel_values[channel]
+        with self._last_lists_lock:
+            last = self._last_lists.pop(key, None)
+        payload, base_version, deltas = value, None, 0
+        if isinstance(value, list) and last is not None:
+            last_version, last_items, last_deltas = last
+            # Reducers append to a copy of the old list, so an unchanged prefix keeps the same objects
+            if (
+                last_deltas < self.snapshot_every
+                and len(value) >= len(last_items)
+                and all(a is b for a, b in zip(last_items, value))
+            ):
+                payload, base_version, deltas = value[len(last_items):], last_version, last_deltas + 1
+        if isinstance(value, list):
+            with self._last_lists_lock:
+                # Copy: nodes may append to the live list in place
+                self._last_lists[key] = (version, list(value), deltas)
+                while len(self._last_lists) > self.max_tracked_channels:
+                    self._last_lists.popitem(last=False)
+        return (*self.serde.dumps_typed(payload), base_version)
+
+    def _prune(self, cur: sqlite3.Cursor, thread_id: str, checkpoint_ns: str) -> None:
+        """Delete every checkpoint (with its writes and blobs) older than the keep_last newest of the thread."""
+        cutoff = cur.execute(
+            "SELECT checkpoint_id, type, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep_last - 1),
+        ).fetchone()
+        if cutoff is None:
+            return
+        for table in ("checkpoints", "writes"):
+            cur.execute(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                (thread_id, checkpoint_ns, cutoff[0]),
+            )
+        # Versions only grow and deltas only point back to the nearest full snapshot, so blobs
+        # older than the snapshot under the oldest kept checkpoint's version are unreferenced
+        channel_versions = self.serde.loads_typed((cutoff[1], cutoff[2]))["channel_versions"]
+        cur.executemany(
+            """DELETE FROM checkpoint_blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version < (
+                SELECT MAX(version) FROM checkpoint_blobs
+                WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND base_version IS NULL AND version <= ?
+            )""",
+            [
+                (thread_id, checkpoint_ns, channel, thread_id, checkpoint_ns, channel, str(version))
+                for channel, version in channel_versions.items()
+            ],
+        )
+
+    def load_channel_values(self, thread_id: str, checkpoint_ns: str, channel_versions: ChannelVersions) -> Dict[str, Any]:
+        """Rebuild the channel values of a checkpoint from its channel versions."""
+        with self.cursor(transaction=False) as cur:
+            # Each requested blob plus the chain of bases under it, oldest (the snapshot) first
+            cur.execute(
+                """WITH RECURSIVE chain(channel, version, type, blob, base_version, depth) AS (
+                    SELECT b.channel, b.version, b.type, b.blob, b.base_version, 0
+                    FROM checkpoint_blobs b JOIN json_each(?) v ON b.channel = v.key AND b.version = v.value
+                    WHERE b.thread_id = ? AND b.checkpoint_ns = ?
+                    UNION ALL
+                    SELECT b.channel, b.version, b.type, b.blob, b.base_version, c.depth + 1
+                    FROM checkpoint_blobs b JOIN chain c ON b.channel = c.channel AND b.version = c.base_version
+                    WHERE b.thread_id = ? AND b.checkpoint_ns = ?
+                )
+                SELECT channel, type, blob, base_version FROM chain ORDER BY channel, depth DESC""",
+                (
+                    json.dumps({channel: str(version) for channel, version in channel_versions.items()}),
+                    thread_id,
+                    checkpoint_ns,
+                    thread_id,
+                    checkpoint_ns,
+                ),
+            )
+            values: Dict[str, Any] = {}
+            for channel, type_, blob, base_version in cur.fetchall():
+                if type_ == "empty":
+                    continue
+                value = self.serde.loads_typed((type_, blob))
+                if base_version is None:
+                    values[channel] = value
+                elif channel in values:
+                    values[channel] = values[channel] + value
+                else:
+                    logger.error(f"Checkpoint blob chain of {channel} in thread {thread_id} is missing its snapshot")
+            return values
+
+    def _with_channel_values(self, checkpoint_tuple: Optional[CheckpointTuple]) -> Optional[CheckpointTuple]:
+        if checkpoint_tuple is None:
+            return None
+        configurable = checkpoint_tuple.config["configurable"]
+        checkpoint = checkpoint_tuple.checkpoint
+        # Rows written before delta storage still carry their values inline
+        missing = {
+            channel: version
+            for channel, version in checkpoint["channel_versions"].items()
+            if channel not in checkpoint["channel_values"]
+        }
+        if missing:
+            values = self.load_channel_values(str(configurable["thread_id"]), configurable.get("checkpoint_ns", ""), missing)
+            checkpoint = {**checkpoint, "channel_values": {**checkpoint["channel_values"], **values}}
+        return checkpoint_tuple._replace(checkpoint=checkpoint)
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        self.flush(config)
+        return self._with_channel_values(super().get_tuple(config))
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        self.flush(config if config and "thread_id" in config.get("configurable", {}) else None)
+        for checkpoint_tuple in super().list(config, filter=filter, before=before, limit=limit):
+            yield self._with_channel_values(checkpoint_tuple)
@@ -0,0 +1,203 @@
+from typing import Any, Dict, Iterator, Optional
+from contextlib import contextmanager
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+try:
+    from .tracing import record_cache_hit
+except:
+    from tracing import record_cache_hit
+
+logger = logging.getLogger(__name__)
+
+_MODEL_PATTERN = re.compile(r"""['"]model(?:_name)?['"]\s*:\s*['"]([^'"]+)['"]""")
+
+
+class SQLiteLLMCache(BaseCache):
+    """Disk-backed LLM response cache shared by every process using the same file.
+
+    Entries are keyed by the hash of the llm string (model name and llm_params, as
+    built by langchain) and the hash of the serialized message list. The database
+    runs in WAL mode so concurrent readers never block the writer. Entries expire
+    after ``ttl_seconds`` and the least recently used ones are evicted once the
+    cache holds more than ``max_entries``.
+
+    Hit/miss counts, plus the tokens and seconds that hits avoided, are kept in a
+    stats table so savings add up across processes. ``stats()`` reads them.
+    """
+
+    def __init__(
+        self,
+        database_path: str = ".cache/llm_cache.sqlite",
+        max_entries: int = 20000,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600,
+        evict_every: int = 64,
+    ):
+        self.database_path = database_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.evict_every = evict_every
+        self._local = threading.local()
+        self._updates_since_evict = 0
+        self._lock = threading.Lock()
+        # Lookup time of misses, used to measure how long the real call took
+        self._pending_misses: Dict[str, float] = {}
+        directory = os.path.dirname(database_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._setup()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.database_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self, begin: str = "BEGIN") -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute(begin)
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _setup(self) -> None:
+        self._connection().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                value TEXT NOT NULL,
+                tokens INTEGER NOT NULL DEFAULT 0,
+                latency REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache (last_access);
+            CREATE TABLE IF NOT EXISTS llm_cache_stats (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                hits INTEGER NOT NULL DEFAULT 0,
+                misses INTEGER NOT NULL DEFAULT 0,
+                saved_tokens INTEGER NOT NULL DEFAULT 0,
+                saved_seconds REAL NOT NULL DEFAULT 0
+            );
+            INSERT OR IGNORE INTO llm_cache_stats (id) VALUES (0);
+            """
+        )
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        llm_hash = hashlib.sha256(llm_string.encode()).hexdigest()
+        prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()
+        return f"{llm_hash}:{prompt_hash}"
+
+    @staticmethod
+    def _model_name(llm_string: str) -> Optional[str]:
+        match = _MODEL_PATTERN.search(llm_string)
+        return match.group(1) if match else None
+
+    @staticmethod
+    def _total_tokens(return_val: RETURN_VAL_TYPE) -> int:
+        total = 0
+        for generation in return_val:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            total += usage.get("total_tokens", 0)
+        return total
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = self._key(prompt, llm_string)
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, tokens, latency, created_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None and self.ttl_seconds is not None and now - row[3] > self.ttl_seconds:
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            row = None
+
+        if row is None:
+            conn.execute("UPDATE llm_cache_stats SET misses = misses + 1 WHERE id = 0")
+            with self._lock:
+                # Calls that failed never reach update(); don't let their keys pile up
+                if len(self._pending_misses) > 10000:
+                    self._pending_misses.clear()
+                self._pending_misses[key] = time.monotonic()
+            return None
+
+        value, tokens, latency, _ = row
+        try:
+            generations = [loads(generation) for generation in json.loads(value)]
+        except Exception as e:
+            logger.warning(f"Dropping unreadable LLM cache entry: {e}")
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            return None
+        with self._transaction() as conn:
+            conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            conn.execute(
+                "UPDATE llm_cache_stats SET hits = hits + 1, saved_tokens = saved_tokens + ?, saved_seconds = saved_seconds + ? WHERE id = 0",
+                (tokens, latency),
+            )
+        record_cache_hit(prompt)
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = self._key(prompt, llm_string)
+        with self._lock:
+            started = self._pending_misses.pop(key, None)
+        latency = time.monotonic() - started if started is not None else 0.0
+        value = json.dumps([dumps(generation) for generation in return_val])
+        now = time.time()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO llm_cache (key, model, value, tokens, latency, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, self._model_name(llm_string), value, self._total_tokens(return_val), latency, now, now),
+        )
+        with self._lock:
+            self._updates_since_evict += 1
+            should_evict = self._updates_since_evict >= self.evict_every
+            if should_evict:
+                self._updates_since_evict = 0
+        if should_evict:
+            self.evict()
+
+    def evict(self) -> None:
+        """Drop expired entries, then the least recently used ones above max_entries."""
+        with self._transaction("BEGIN IMMEDIATE") as conn:
+            if self.ttl_seconds is not None:
+                conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self, **kwargs: Any) -> None:
+        conn = self._connection()
+        conn.execute("DELETE FROM llm_cache")
+        conn.execute("UPDATE llm_cache_stats SET hits = 0, misses = 0, saved_tokens = 0, saved_seconds = 0 WHERE id = 0")
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connection()
+        hits, misses, saved_tokens, saved_seconds = conn.execute(
+            "SELECT hits, misses, saved_tokens, saved_seconds FROM llm_cache_stats WHERE id = 0"
+        ).fetchone()
+        entries = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {
+            "entries": entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "saved_tokens": saved_tokens,
+            "saved_seconds": saved_seconds,
+        }
@@ -0,0 +1,84 @@
+from typing import Any, Callable, Dict, Tuple
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class LLMClientPool:
+    """Chat clients shared by every agent that asks for the same (provider, model, params).
+
+    Chat models hold no per-conversation state, so agents configured alike can use
+    the same client, and with it the same warm HTTP connections. Params are frozen
+    into a canonical JSON string for the key; values that don't serialize are keyed
+    by their repr, so distinct objects (callbacks, clients) never share an entry.
+
+    Providers that accept an ``http_client`` get one keep-alive ``httpx.Client``
+    per provider from ``http_client()``, reused by all of that provider's models.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 60.0,
+    ):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self._clients: Dict[Tuple[str, str, str], Any] = {}
+        self._http_clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        # build() asks for the http client while _lock is held
+        self._http_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def freeze(params: Dict[str, Any]) -> str:
+        return json.dumps(params, sort_keys=True, default=repr)
+
+    def get(self, provider: str, model: str, params: Dict[str, Any], build: Callable[[], Any]) -> Any:
+        """Return the shared client for this key, calling ``build()`` the first time."""
+        key = (provider, model, self.freeze(params))
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.hits += 1
+                return client
+            self.misses += 1
+            # Built under the lock so concurrent agents don't create duplicates
+            client = self._clients[key] = build()
+        logger.debug(f"Created shared {provider} client for {model}")
+        return client
+
+    def http_client(self, provider: str) -> Any:
+        with self._http_lock:
+            if provider not in self._http_clients:
+                import httpx
+                self._http_clients[provider] = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_keepalive_connections,
+                        keepalive_expiry=self.keepalive_expiry,
+                    ),
+                    timeout=httpx.Timeout(600.0, connect=10.0),
+                )
+            return self._http_clients[provider]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock, self._http_lock:
+            return {
+                "clients": len(self._clients),
+                "http_pools": len(self._http_clients),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def clear(self) -> None:
+        with self._lock, self._http_lock:
+            for http_client in self._http_clients.values():
+                http_client.close()
+            self._clients.clear()
+            self._http_clients.clear()
@@ -0,0 +1,180 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+from langchain_core.messages import BaseMessage, HumanMessage, message_to_dict, messages_from_dict
+
+try:
+    import fcntl
+except ImportError:  # Windows: the thread lock still serializes writers within a process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Marker kept in place of archived string entries, e.g. "[12 earlier entries archived @4096]"
+_STRING_MARKER = re.compile(r"^\[(\d+) earlier entries archived @(\d+|-)\]")
+# Record key, written first on every line so it can be read without parsing the items
+_RECORD_KEY = re.compile(rb'^\{"key": "([0-9a-f]+)"')
+# Separates the marker header from the truncated transcript in transcript markers
+TRANSCRIPT_HEADER = " Truncated transcript of the earlier discussion:\n"
+
+
+class MessageArchive:
+    """Append-only JSONL log of the items that windowed reducers drop from the state.
+
+    Each spill is one line: the channel, the dropped items and the byte offset of
+    the previous spill of the same conversation (``prev``). The state only keeps the
+    offset of the newest spill in its archive marker, so older history is paged by
+    following the ``prev`` chain, without the log knowing which thread wrote it.
+
+    Records are keyed by a hash of their content, and appending a record that is
+    already in the log returns its offset instead of writing it again: LangGraph
+    may re-run a reducer when a node is retried or a step replayed. Replays only
+    repeat recent spills, so only the keys of the last ``max_keys`` records are
+    kept, and at most the last ``scan_bytes`` of the log are read to find them.
+    """
+
+    def __init__(self, path: str = ".cache/meeting_archive.jsonl", max_keys: int = 4096, scan_bytes: int = 16 * 1024 * 1024):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.max_keys = max_keys
+        self.scan_bytes = scan_bytes
+        # Offsets of the most recent records by key (least recently seen first), and how far the log has been read
+        self._offsets: "OrderedDict[str, int]" = OrderedDict()
+        self._scanned = 0
+
+    @staticmethod
+    def _dump_item(item: Any) -> Any:
+        if isinstance(item, BaseMessage):
+            return {"message": message_to_dict(item)}
+        return {"value": item}
+
+    @staticmethod
+    def _load_item(data: Dict[str, Any]) -> Any:
+        if "message" in data:
+            return messages_from_dict([data["message"]])[0]
+        return data["value"]
+
+    def _remember(self, key: str, offset: int) -> None:
+        self._offsets[key] = offset
+        self._offsets.move_to_end(key)
+        if len(self._offsets) > self.max_keys:
+            self._offsets.popitem(last=False)
+
+    def _catch_up(self, f) -> None:
+        """Index the records written since the last call, by this or another process."""
+        end = f.seek(0, os.SEEK_END)
+        start = max(self._scanned, end - self.scan_bytes)
+        if start > self._scanned:
+            # Skip older records, starting at the first line that begins inside the tail
+            f.seek(start - 1)
+            f.readline()
+        else:
+            f.seek(self._scanned)
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                break  # End of the log, or a line still being written
+            match = _RECORD_KEY.match(line)
+            key = match.group(1).decode() if match else None
+            if key and key not in self._offsets:
+                self._remember(key, offset)
+            self._scanned = f.tell()
+
+    def append(self, channel: str, items: List[Any], prev: Optional[int] = None) -> int:
+        """Store ``items`` and return the offset of their record (of the existing one if already stored)."""
+        record = json.dumps({
+            "channel": channel,
+            "prev": prev,
+            "count": len(items),
+            "items": [self._dump_item(item) for item in items],
+        }, default=str)
+        key = hashlib.sha256(record.encode()).hexdigest()
+        line = f'{{"key": "{key}", {record[1:]}\n'
+        with self._lock, open(self.path, "a+b") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                self._catch_up(f)
+                if key in self._offsets:
+                    self._offsets.move_to_end(key)
+                    return self._offsets[key]
+                offset = f.seek(0, os.SEEK_END)
+                f.write(line.encode())
+                f.flush()
+                self._remember(key, offset)
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        return offset
+
+    def read(self, offset: int) -> Tuple[List[Any], Optional[int]]:
+        """Return the items of the record at ``offset`` and the offset of the one before it."""
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            record = json.loads(f.readline())
+        return [self._load_item(item) for item in record["items"]], record["prev"]
+
+    def pages(self, offset: Optional[int]) -> Iterator[List[Any]]:
+        """Yield archived batches from newest to oldest, starting at ``offset``."""
+        while offset is not None:
+            items, offset = self.read(offset)
+            yield items
+
+
+def archive_marker(items: List[Any]) -> Optional[Dict[str, Any]]:
+    """Return ``{"offset", "count"}`` if ``items`` starts with an archive marker."""
+    if not items:
+        return None
+    first = items[0]
+    if isinstance(first, BaseMessage):
+        return first.additional_kwargs.get("archive")
+    if isinstance(first, str):
+        match = _STRING_MARKER.match(first)
+        if match:
+            offset = match.group(2)
+            return {"count": int(match.group(1)), "offset": None if offset == "-" else int(offset)}
+    return None
+
+
+def _snippet(item: Any, max_chars: int = 200) -> str:
+    text = item.content if isinstance(item, BaseMessage) else item
+    text = text if isinstance(text, str) else json.dumps(text, default=str)
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[:max_chars] + "..."
+
+
+def truncated_transcript(previous: str, dropped: List[Any], max_chars: int = 2000) -> str:
+    """Extend ``previous`` with one line (a 200-character snippet) per dropped item, keeping the newest ``max_chars``."""
+    lines = [previous] if previous else []
+    lines += [f"- {_snippet(item)}" for item in dropped]
+    transcript = "\n".join(lines)
+    return transcript if len(transcript) <= max_chars else "..." + transcript[-max_chars:]
+
+
+def make_marker(channel: str, previous: Optional[Any], dropped: List[Any], offset: Optional[int], transcript: bool) -> Any:
+    """Build the item that stands in for everything archived so far."""
+    previous_info = archive_marker([previous]) if previous is not None else None
+    count = (previous_info or {}).get("count", 0) + len(dropped)
+    if dropped and not isinstance(dropped[0], BaseMessage):
+        return f"[{count} earlier entries archived @{'-' if offset is None else offset}]"
+
+    content = f"[{count} earlier messages archived]"
+    if transcript:
+        previous_transcript = previous.content.partition(TRANSCRIPT_HEADER)[2] if previous_info else ""
+        content += TRANSCRIPT_HEADER + truncated_transcript(previous_transcript, dropped)
+    return HumanMessage(
+        content=content,
+        # Unique per spill (the record's offset) so caches keyed by message id never see stale content
+        id=f"archive-{channel}-{offset if offset is not None else uuid.uuid4().hex}",
+        additional_kwargs={"archive": {"offset": offset, "count": count}},
+    )
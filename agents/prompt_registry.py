@@ -0,0 +1,117 @@
+from typing import Any, Dict, Optional
+import logging
+import os
+import threading
+import time
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_SUFFIX = ".j2"
+
+
+class PromptRegistry:
+    """Every ``.j2`` template under ``prompt_dir``, compiled once and shared by all agents.
+
+    Templates are compiled at startup (through a bytecode cache on disk, so later
+    processes skip parsing too) and looked up by their path relative to
+    ``prompt_dir``, e.g. ``"level1/Nexus/decision_prompt.j2"``. Jinja's per-call
+    ``auto_reload`` stat is disabled; instead the files are checked for changes at
+    most every ``check_interval`` seconds and only changed or new templates are
+    recompiled. ``stats()`` reports render counts and times per template.
+    """
+
+    def __init__(
+        self,
+        prompt_dir: str,
+        bytecode_cache_dir: Optional[str] = ".cache/jinja",
+        check_interval: float = 2.0,
+    ):
+        self.prompt_dir = prompt_dir
+        self.check_interval = check_interval
+        bytecode_cache = None
+        if bytecode_cache_dir:
+            os.makedirs(bytecode_cache_dir, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(bytecode_cache_dir)
+        self.env = Environment(
+            loader=FileSystemLoader(prompt_dir),
+            bytecode_cache=bytecode_cache,
+            auto_reload=False,
+            cache_size=-1,
+        )
+        self._templates: Dict[str, Template] = {}
+        self._mtimes: Dict[str, int] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self.reload()
+
+    def _scan(self) -> Dict[str, int]:
+        mtimes = {}
+        for root, _, files in os.walk(self.prompt_dir):
+            for file_name in files:
+                if file_name.endswith(TEMPLATE_SUFFIX):
+                    path = os.path.join(root, file_name)
+                    name = os.path.relpath(path, self.prompt_dir).replace(os.sep, "/")
+                    mtimes[name] = os.stat(path).st_mtime_ns
+        return mtimes
+
+    def reload(self) -> int:
+        """Compile new and changed templates, drop deleted ones; return how many were compiled."""
+        mtimes = self._scan()
+        with self._lock:
+            changed = [name for name, mtime in mtimes.items() if self._mtimes.get(name) != mtime]
+            if changed and self._mtimes:
+                # Jinja keeps its own compiled copy; make it read the changed files again
+                self.env.cache.clear()
+            for name in changed:
+                self._templates[name] = self.env.get_template(name)
+            for name in set(self._templates) - set(mtimes):
+                del self._templates[name]
+            self._mtimes = mtimes
+            self._last_check = time.monotonic()
+        if changed:
+            logger.info(f"Compiled {len(changed)} prompt template(s) from {self.prompt_dir}")
+        return len(changed)
+
+    def get_template(self, name: str) -> Template:
+        if time.monotonic() - self._last_check > self.check_interval:
+            self.reload()
+        template = self._templates.get(name)
+        if template is None:
+            # Not a .j2 file, or created since the last check
+            template = self.env.get_template(name)
+            with self._lock:
+                self._templates[name] = template
+        return template
+
+    def render(self, name: str, **context: Any) -> str:
+        template = self.get_template(name)
+        start = time.perf_counter()
+        rendered = template.render(**context)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            timing = self._timings.setdefault(name, {"renders": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            timing["renders"] += 1
+            timing["total_seconds"] += elapsed
+            timing["max_seconds"] = max(timing["max_seconds"], elapsed)
+        return rendered
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                name: {**timing, "mean_seconds": timing["total_seconds"] / timing["renders"]}
+                for name, timing in self._timings.items()
+            }
+
+
+_registries: Dict[str, PromptRegistry] = {}
+_registries_lock = threading.Lock()
+
+def get_prompt_registry(prompt_dir: str) -> PromptRegistry:
+    """Return the process-wide registry of ``prompt_dir``, building it on first use."""
+    key = os.path.abspath(prompt_dir)
+    with _registries_lock:
+        if key not in _registries:
+            _registries[key] = PromptRegistry(prompt_dir)
+        return _registries[key]
@@ -0,0 +1,140 @@
+from typing import Any, Dict, Optional, Tuple
+from collections import deque
+import asyncio
+import logging
+import threading
+import time
+from langchain_core.rate_limiters import BaseRateLimiter
+try:
+    from .tracing import record_throttle
+except:
+    from tracing import record_throttle
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REQUESTS_PER_MINUTE = 60
+
+
+class ProviderRateLimiter(BaseRateLimiter):
+    """Token bucket rate limiter for one (provider, model) pair.
+
+    Every call reserves a token up front. When the bucket is empty the call is
+    scheduled for the moment its token will have been refilled and sleeps exactly
+    that long, so callers only wait when the quota really requires it and queued
+    callers are served in arrival order without polling.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        model: str,
+        requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+        max_burst: Optional[int] = None,
+        history_size: int = 1000,
+    ):
+        self.provider = provider
+        self.model = model
+        self.requests_per_second = requests_per_minute / 60.0
+        self.max_burst = max_burst or max(1, int(self.requests_per_second))
+        self.available_tokens = float(self.max_burst)
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+        # Throttle time of the most recent calls, plus running totals
+        self.throttle_history = deque(maxlen=history_size)
+        self.calls = 0
+        self.throttled_calls = 0
+        self.total_throttle_time = 0.0
+
+    def _reserve(self) -> float:
+        """Take a token and return how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self.available_tokens = min(
+                float(self.max_burst),
+                self.available_tokens + (now - self.last_refill) * self.requests_per_second,
+            )
+            self.last_refill = now
+            self.available_tokens -= 1
+            if self.available_tokens >= 0:
+                return 0.0
+            return -self.available_tokens / self.requests_per_second
+
+    def _release(self) -> None:
+        with self._lock:
+            self.available_tokens += 1
+
+    def _record(self, wait: float) -> None:
+        with self._lock:
+            self.calls += 1
+            self.throttle_history.append(wait)
+            if wait > 0:
+                self.throttled_calls += 1
+                self.total_throttle_time += wait
+        if wait > 0:
+            record_throttle(wait)
+            logger.debug(f"Throttled {self.provider}/{self.model} call for {wait:.2f}s")
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        wait = self._reserve()
+        if wait > 0 and not blocking:
+            self._release()
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        self._record(wait)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        wait = self._reserve()
+        if wait > 0 and not blocking:
+            self._release()
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._record(wait)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "requests_per_minute": self.requests_per_second * 60,
+            "calls": self.calls,
+            "throttled_calls": self.throttled_calls,
+            "total_throttle_time": self.total_throttle_time,
+            "last_throttle_time": self.throttle_history[-1] if self.throttle_history else 0.0,
+        }
+
+
+class RateLimitScheduler:
+    """Hands out one shared ProviderRateLimiter per (provider, model).
+
+    ``limits`` is the RATE_LIMITS section of Data/llm_models.json: per provider, a
+    "default" entry and optional per-model overrides, each holding
+    ``requests_per_minute`` and optionally ``max_burst``.
+    """
+
+    def __init__(self, limits: Dict[str, Dict[str, Dict[str, Any]]]):
+        self.limits = limits
+        self._limiters: Dict[Tuple[str, str], ProviderRateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def _limit_for(self, provider: str, model: str) -> Dict[str, Any]:
+        provider_limits = self.limits.get(provider, {})
+        return {
+            "requests_per_minute": DEFAULT_REQUESTS_PER_MINUTE,
+            **provider_limits.get("default", {}),
+            **provider_limits.get(model, {}),
+        }
+
+    def limiter_for(self, provider: str, model: str) -> ProviderRateLimiter:
+        key = (provider, model)
+        with self._lock:
+            if key not in self._limiters:
+                self._limiters[key] = ProviderRateLimiter(provider, model, **self._limit_for(provider, model))
+            return self._limiters[key]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            limiters = list(self._limiters.items())
+        return {f"{provider}/{model}": limiter.stats() for (provider, model), limiter in limiters}
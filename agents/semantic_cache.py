@@ -0,0 +1,213 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import logging
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class _Index:
+    """Unit-normalized question vectors of one namespace with their answers, brute-force searched."""
+
+    def __init__(self, dim: int, capacity: int = 64):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.created = np.zeros(capacity, dtype=np.float64)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.answers: List[str] = [None] * capacity
+        self.size = 0
+
+    def search(self, vector: np.ndarray, not_before: float) -> Tuple[int, float]:
+        """Best live row and its cosine similarity, or (-1, -1.0)."""
+        if not self.size:
+            return -1, -1.0
+        scores = self.vectors[:self.size] @ vector
+        scores[self.created[:self.size] < not_before] = -1.0
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+    def add(self, vector: np.ndarray, answer: str, now: float, max_entries: int, not_before: float) -> None:
+        if self.size >= max_entries:
+            self.compact(not_before, max_entries - 1)
+        if self.size == len(self.vectors):
+            grow = len(self.vectors)
+            self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors[:grow])])
+            self.created = np.concatenate([self.created, np.zeros(grow)])
+            self.last_used = np.concatenate([self.last_used, np.zeros(grow)])
+            self.answers.extend([None] * grow)
+        row = self.size
+        self.vectors[row] = vector
+        self.created[row] = self.last_used[row] = now
+        self.answers[row] = answer
+        self.size += 1
+
+    def compact(self, not_before: float, keep: int) -> None:
+        """Drop expired rows, then the least recently used ones beyond ``keep``."""
+        live = np.flatnonzero(self.created[:self.size] >= not_before)
+        if len(live) > keep:
+            live = np.sort(live[np.argsort(self.last_used[live])[len(live) - keep:]])
+        n = len(live)
+        self.vectors[:n] = self.vectors[live]
+        self.created[:n] = self.created[live]
+        self.last_used[:n] = self.last_used[live]
+        answers = [self.answers[i] for i in live]
+        self.answers[:n] = answers
+        self.answers[n:self.size] = [None] * (self.size - n)
+        self.size = n
+
+
+class SemanticCache:
+    """Answers to research questions, reused for questions that mean the same thing.
+
+    Questions are embedded and compared by cosine similarity against the answered
+    ones of the same namespace (e.g. assistant level and model) with a NumPy
+    brute-force search; the best match at or above ``threshold`` is a hit. Entries
+    live ``ttl_seconds`` and each namespace keeps at most ``max_entries``, evicting
+    the least recently used. The index is in-process, shared by every agent and
+    meeting that uses the instance.
+
+    ``embeddings`` is any langchain Embeddings object; otherwise ``build_embeddings()``
+    (by default a plain OpenAIEmbeddings for ``model``) creates one on first use.
+    Every embedding request first takes a token from ``rate_limiter``, if given.
+    When embedding fails the cache stands aside for ``retry_after`` seconds and
+    every lookup is a miss.
+    """
+
+    def __init__(
+        self,
+        embeddings: Any = None,
+        model: str = "text-embedding-3-small",
+        threshold: float = 0.92,
+        ttl_seconds: Optional[float] = 24 * 3600,
+        max_entries: int = 5000,
+        retry_after: float = 60.0,
+        build_embeddings: Optional[Callable[[], Any]] = None,
+        rate_limiter: Any = None,
+    ):
+        self._embeddings = embeddings
+        self.build_embeddings = build_embeddings
+        self.rate_limiter = rate_limiter
+        self.model = model
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.retry_after = retry_after
+        self._indexes: Dict[str, _Index] = {}
+        self._lock = threading.Lock()
+        # Vectors of recent lookups, so storing the answer doesn't embed the question again
+        self._recent: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._disabled_until = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def embeddings(self) -> Any:
+        if self._embeddings is None:
+            if self.build_embeddings is not None:
+                self._embeddings = self.build_embeddings()
+            else:
+                from langchain_openai import OpenAIEmbeddings
+                self._embeddings = OpenAIEmbeddings(model=self.model)
+        return self._embeddings
+
+    def _not_before(self, now: float) -> float:
+        return now - self.ttl_seconds if self.ttl_seconds is not None else float("-inf")
+
+    def _normalized(self, text: str, vector: List[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        with self._lock:
+            self._recent[text] = vector
+            if len(self._recent) > 256:
+                self._recent.popitem(last=False)
+        return vector
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._recent.get(text)
+        if vector is not None:
+            return vector
+        if time.time() < self._disabled_until:
+            return None
+        try:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            return self._normalized(text, self.embeddings.embed_query(text))
+        except Exception as e:
+            logger.warning(f"Semantic cache disabled for {self.retry_after:.0f}s, embedding failed: {e}")
+            self._disabled_until = time.time() + self.retry_after
+            return None
+
+    async def _aembed(self, text: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._recent.get(text)
+        if vector is not None:
+            return vector
+        if time.time() < self._disabled_until:
+            return None
+        try:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.aacquire()
+            return self._normalized(text, await self.embeddings.aembed_query(text))
+        except Exception as e:
+            logger.warning(f"Semantic cache disabled for {self.retry_after:.0f}s, embedding failed: {e}")
+            self._disabled_until = time.time() + self.retry_after
+            return None
+
+    def _search(self, namespace: str, question: str, vector: Optional[np.ndarray]) -> Optional[str]:
+        answer = None
+        with self._lock:
+            index = self._indexes.get(namespace)
+            if vector is not None and index is not None:
+                now = time.time()
+                row, score = index.search(vector, self._not_before(now))
+                if score >= self.threshold:
+                    index.last_used[row] = now
+                    answer = index.answers[row]
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if answer is not None:
+            logger.info(f"Semantic cache hit in {namespace} ({score:.3f}): {question[:80]}")
+        return answer
+
+    def _store(self, namespace: str, vector: Optional[np.ndarray], answer: str) -> None:
+        if vector is None or not answer:
+            return
+        with self._lock:
+            index = self._indexes.get(namespace)
+            if index is None:
+                index = self._indexes[namespace] = _Index(len(vector))
+            now = time.time()
+            index.add(vector, answer, now, self.max_entries, self._not_before(now))
+
+    def lookup(self, namespace: str, question: str) -> Optional[str]:
+        """Answer of the most similar live question of ``namespace``, if similar enough."""
+        return self._search(namespace, question, self._embed(question))
+
+    async def alookup(self, namespace: str, question: str) -> Optional[str]:
+        return self._search(namespace, question, await self._aembed(question))
+
+    def update(self, namespace: str, question: str, answer: str) -> None:
+        self._store(namespace, self._embed(question), answer)
+
+    async def aupdate(self, namespace: str, question: str, answer: str) -> None:
+        self._store(namespace, await self._aembed(question), answer)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._indexes.clear()
+            self._recent.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": sum(index.size for index in self._indexes.values()),
+                "namespaces": len(self._indexes),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0,
+            }
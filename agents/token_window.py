@@ -0,0 +1,124 @@
+from typing import Any, Callable, Dict, Hashable, List, Optional
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import threading
+from langchain_core.messages import BaseMessage
+
+logger = logging.getLogger(__name__)
+
+# Per-message overhead of the chat format (role, separators), as counted by OpenAI
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def _message_text(message: Any) -> str:
+    content = getattr(message, "content", message)
+    return content if isinstance(content, str) else json.dumps(content, default=str)
+
+
+def _message_key(message: Any) -> Hashable:
+    message_id = getattr(message, "id", None)
+    if message_id:
+        return message_id
+    text = _message_text(message)
+    return (type(message).__name__, hashlib.sha1(text.encode()).hexdigest())
+
+
+def tiktoken_counter(model: str = "gpt-4o") -> Callable[[str], int]:
+    """Return a text -> token count function, falling back to ~4 chars/token without tiktoken."""
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text))
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable ({e}), approximating token counts")
+        return lambda text: len(text) // 4 + 1
+
+
+class _Window:
+    __slots__ = ("length", "last_key", "start", "total")
+
+    def __init__(self):
+        self.length = 0
+        self.last_key = None
+        self.start = 0
+        self.total = 0
+
+
+class IncrementalTrimmer:
+    """Keep the newest messages that fit in ``max_tokens``, counting each message once.
+
+    Token counts are cached per message (by id, or by content when there is no id),
+    and a running window is kept per message stream (identified by its first
+    message). When a stream has only grown since the last call, only the new
+    messages are counted and the window start moves forward, so each call costs
+    O(new messages) instead of re-tokenizing the whole history.
+
+    Messages are kept whole; the newest message is always kept, even when it alone
+    exceeds the budget. Drop-in for ``trimmer.invoke(messages)``.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 5000,
+        token_counter: Optional[Callable[[str], int]] = None,
+        cache_size: int = 10000,
+        max_streams: int = 64,
+    ):
+        self.max_tokens = max_tokens
+        self.token_counter = token_counter or _shared_counter()
+        self.cache_size = cache_size
+        self.max_streams = max_streams
+        self._counts: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._windows: "OrderedDict[Hashable, _Window]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, message: Any) -> int:
+        key = _message_key(message)
+        count = self._counts.get(key)
+        if count is None:
+            count = self.token_counter(_message_text(message)) + MESSAGE_OVERHEAD_TOKENS
+            self._counts[key] = count
+            if len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+        return count
+
+    def _window_for(self, messages: List[Any]) -> _Window:
+        stream = _message_key(messages[0])
+        window = self._windows.pop(stream, None)
+        if window is None or window.length > len(messages) or (
+            window.length and _message_key(messages[window.length - 1]) != window.last_key
+        ):
+            # New stream, or history rewritten: start over (cached counts make this cheap)
+            window = _Window()
+        self._windows[stream] = window
+        if len(self._windows) > self.max_streams:
+            self._windows.popitem(last=False)
+        return window
+
+    def invoke(self, messages: List[Any]) -> List[Any]:
+        if not messages:
+            return []
+        with self._lock:
+            window = self._window_for(messages)
+            for message in messages[window.length:]:
+                window.total += self.count(message)
+            window.length = len(messages)
+            window.last_key = _message_key(messages[-1])
+            while window.total > self.max_tokens and window.start < window.length - 1:
+                window.total -= self.count(messages[window.start])
+                window.start += 1
+            return messages[window.start:]
+
+
+_counter = None
+
+def _shared_counter() -> Callable[[str], int]:
+    global _counter
+    if _counter is None:
+        _counter = tiktoken_counter()
+    return _counter
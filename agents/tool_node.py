@@ -0,0 +1,133 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import concurrent.futures
+import logging
+import time
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from langchain_core.tools import BaseTool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOOL_TIMEOUT = 30.0
+
+
+def pending_tool_calls(messages: Sequence[BaseMessage]) -> Tuple[Optional[AIMessage], List[ToolMessage]]:
+    """The last assistant message that asked for tools and the tool results that follow it.
+
+    Returns (None, []) when the conversation holds no tool round.
+    """
+    results = []
+    for message in reversed(messages):
+        if isinstance(message, ToolMessage):
+            results.append(message)
+        elif isinstance(message, AIMessage) and message.tool_calls:
+            return message, results[::-1]
+        else:
+            break
+    return None, results[::-1]
+
+
+def split_tool_round(messages: Sequence[BaseMessage]) -> Tuple[Optional[BaseMessage], List[BaseMessage]]:
+    """The question an assistant is answering and, after a tool round, that round's messages.
+
+    Without a tool round the question is the last message; otherwise it is the one
+    before the tool calls, and the tool calls and their results come second.
+    """
+    tool_request, tool_results = pending_tool_calls(messages)
+    if tool_request is None or not tool_results:
+        return (messages[-1] if messages else None), []
+    position = next(i for i, message in enumerate(messages) if message is tool_request)
+    return (messages[position - 1] if position else tool_request), [tool_request, *tool_results]
+
+
+class ParallelToolNode:
+    """Graph node running every tool call of the last assistant message at once.
+
+    Unlike langgraph's ToolNode it reads and writes a conversation channel of any
+    name (``messages_key``), so it fits the per-agent channels of the unified
+    state. Each call gets its own timeout (``timeouts`` by tool name, else
+    ``default_timeout``); a call that fails or times out answers with an error
+    ToolMessage instead of failing the node. Results come back in the order of
+    the tool calls, so a turn with three searches takes as long as the slowest.
+    """
+
+    def __init__(
+        self,
+        tools: Sequence[BaseTool],
+        messages_key: str,
+        name: Optional[str] = None,
+        timeouts: Optional[Dict[str, float]] = None,
+        default_timeout: float = DEFAULT_TOOL_TIMEOUT,
+    ):
+        self.tools = {tool.name: tool for tool in tools or []}
+        self.messages_key = messages_key
+        # Owner agent, so traces of the node are attributed to it
+        self.name = name
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+
+    def timeout(self, tool_name: str) -> float:
+        return self.timeouts.get(tool_name, self.default_timeout)
+
+    def _tool_calls(self, state) -> List[Dict[str, Any]]:
+        messages = state.get(self.messages_key, []) if isinstance(state, dict) else getattr(state, self.messages_key)
+        message = messages[-1] if messages else None
+        if not isinstance(message, AIMessage) or not message.tool_calls:
+            return []
+        return message.tool_calls
+
+    def _message(self, call: Dict[str, Any], output: Any = None, error: Optional[str] = None) -> ToolMessage:
+        if error is not None:
+            return ToolMessage(content=f"Error: {error}", name=call["name"], tool_call_id=call["id"], status="error")
+        return ToolMessage(content=output if isinstance(output, str) else str(output), name=call["name"], tool_call_id=call["id"])
+
+    def _update(self, messages: List[ToolMessage], started: float) -> Dict[str, Any]:
+        logger.info(f"{len(messages)} tool call(s) for {self.messages_key} in {time.perf_counter() - started:.2f}s")
+        return {self.messages_key: messages}
+
+    def tools_node(self, state, config=None) -> Dict[str, Any]:
+        calls = self._tool_calls(state)
+        started = time.perf_counter()
+        messages = []
+        unknown = [call for call in calls if call["name"] not in self.tools]
+        runnable = [call for call in calls if call["name"] in self.tools]
+        # Threads of timed-out calls can't be stopped, so don't wait for them on the way out
+        executor = ContextThreadPoolExecutor(max_workers=max(1, len(runnable)))
+        try:
+            futures = {call["id"]: executor.submit(self.tools[call["name"]].invoke, call["args"], config) for call in runnable}
+            for call in calls:
+                if call in unknown:
+                    messages.append(self._message(call, error=f"unknown tool {call['name']}"))
+                    continue
+                remaining = started + self.timeout(call["name"]) - time.perf_counter()
+                try:
+                    messages.append(self._message(call, futures[call["id"]].result(timeout=max(remaining, 0.0))))
+                except concurrent.futures.TimeoutError:
+                    logger.warning(f"Tool {call['name']} timed out after {self.timeout(call['name']):g}s")
+                    messages.append(self._message(call, error=f"{call['name']} timed out after {self.timeout(call['name']):g}s"))
+                except Exception as e:
+                    logger.warning(f"Tool {call['name']} failed: {e}")
+                    messages.append(self._message(call, error=f"{type(e).__name__}: {e}"))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return self._update(messages, started)
+
+    async def atools_node(self, state, config=None) -> Dict[str, Any]:
+        calls = self._tool_calls(state)
+        started = time.perf_counter()
+
+        async def run(call: Dict[str, Any]) -> ToolMessage:
+            tool = self.tools.get(call["name"])
+            if tool is None:
+                return self._message(call, error=f"unknown tool {call['name']}")
+            try:
+                return self._message(call, await asyncio.wait_for(tool.ainvoke(call["args"], config), self.timeout(call["name"])))
+            except asyncio.TimeoutError:
+                logger.warning(f"Tool {call['name']} timed out after {self.timeout(call['name']):g}s")
+                return self._message(call, error=f"{call['name']} timed out after {self.timeout(call['name']):g}s")
+            except Exception as e:
+                logger.warning(f"Tool {call['name']} failed: {e}")
+                return self._message(call, error=f"{type(e).__name__}: {e}")
+
+        return self._update(list(await asyncio.gather(*(run(call) for call in calls))), started)
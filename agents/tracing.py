@@ -0,0 +1,489 @@
+from typing import Any, Callable, Dict, List, Optional
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+import atexit
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.load import dumps
+from langchain_core.outputs import LLMResult
+from langchain_core.tracers.context import register_configure_hook
+
+logger = logging.getLogger(__name__)
+
+# Span of the graph node running in the current task, if it is traced
+_current_span: ContextVar[Optional["NodeSpan"]] = ContextVar("node_trace_span", default=None)
+# Set while a traced node runs; langchain then attaches the handler to every model call inside it
+_trace_handler: ContextVar[Optional[BaseCallbackHandler]] = ContextVar("node_trace_handler", default=None)
+register_configure_hook(_trace_handler, inheritable=True)
+
+TRACE_FIELDS = (
+    "ts", "thread_id", "node", "agent", "function", "wall_seconds", "throttle_seconds", "llm_seconds",
+    "llm_calls", "input_tokens", "output_tokens", "cache_hits", "cost_usd", "models", "speculation", "error",
+)
+
+# Outcomes of speculative assistant prefetches in this process, traced or not
+speculation_counts = {"used": 0, "discarded": 0}
+_speculation_lock = threading.Lock()
+
+
+class NodeSpan:
+    """What one run of a graph node spent: time, throttling, LLM calls, tokens and cost."""
+
+    def __init__(self, node: str, agent: Optional[str], function: str, thread_id: Optional[str]):
+        self.node = node
+        self.agent = agent
+        self.function = function
+        self.thread_id = thread_id
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.throttle_seconds = 0.0
+        self.llm_seconds = 0.0
+        self.llm_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_hits = 0
+        self.cost_usd = 0.0
+        self.models = set()
+        # "used" or "discarded" when the node prefetched an assistant answer
+        self.speculation = None
+        # Prompt hashes of cache hits not yet matched to their model call
+        self.pending_cache_hits = Counter()
+        self._lock = threading.Lock()
+
+    def add_throttle(self, seconds: float) -> None:
+        with self._lock:
+            self.throttle_seconds += seconds
+
+    def add_cache_hit(self, prompt_key: str) -> None:
+        with self._lock:
+            self.pending_cache_hits[prompt_key] += 1
+
+    def take_cache_hit(self, prompt_key: str) -> bool:
+        """Whether the call with this prompt was answered from the cache, matching at most one hit."""
+        with self._lock:
+            if not self.pending_cache_hits[prompt_key]:
+                del self.pending_cache_hits[prompt_key]
+                return False
+            self.pending_cache_hits[prompt_key] -= 1
+            return True
+
+    def add_llm_call(self, seconds: float, model: Optional[str], input_tokens: int, output_tokens: int, cost: Callable[[Optional[str], int, int], float], cached: bool = False) -> None:
+        with self._lock:
+            if cached:
+                # The call was answered from the cache: its tokens were not billed
+                self.cache_hits += 1
+            else:
+                self.input_tokens += input_tokens
+                self.output_tokens += output_tokens
+                self.cost_usd += cost(model, input_tokens, output_tokens)
+            self.llm_calls += 1
+            self.llm_seconds += seconds
+            if model:
+                self.models.add(model)
+
+    def record(self, error: Optional[BaseException] = None) -> Dict[str, Any]:
+        return {
+            "ts": datetime.fromtimestamp(self.started_at).isoformat(),
+            "thread_id": self.thread_id,
+            "node": self.node,
+            "agent": self.agent,
+            "function": self.function,
+            "wall_seconds": time.perf_counter() - self.start,
+            "throttle_seconds": self.throttle_seconds,
+            "llm_seconds": self.llm_seconds,
+            "llm_calls": self.llm_calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_hits": self.cache_hits,
+            "cost_usd": self.cost_usd,
+            "models": ",".join(sorted(self.models)),
+            "speculation": self.speculation,
+            "error": f"{type(error).__name__}: {error}" if error else None,
+        }
+
+
+def record_throttle(seconds: float) -> None:
+    """Charge ``seconds`` spent waiting on a rate limit or concurrency slot to the running node."""
+    span = _current_span.get()
+    if span is not None and seconds > 0:
+        span.add_throttle(seconds)
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode()).hexdigest()
+
+
+def record_cache_hit(prompt: str) -> None:
+    """Mark the running node's model call for ``prompt`` (as the LLM cache sees it) as answered from the cache."""
+    span = _current_span.get()
+    if span is not None:
+        span.add_cache_hit(prompt_key(prompt))
+
+
+def record_speculation(used: bool) -> None:
+    """Count a speculative prefetch as used or discarded, on the running node's span too."""
+    outcome = "used" if used else "discarded"
+    with _speculation_lock:
+        speculation_counts[outcome] += 1
+    span = _current_span.get()
+    if span is not None:
+        span.speculation = outcome
+
+
+def speculation_stats() -> Dict[str, Any]:
+    with _speculation_lock:
+        used, discarded = speculation_counts["used"], speculation_counts["discarded"]
+    return {"used": used, "discarded": discarded, "hit_rate": used / (used + discarded) if used + discarded else 0.0}
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """Adds the latency and token usage of every model call to the span of its node."""
+
+    run_inline = True
+
+    def __init__(self, tracer: "NodeTracer"):
+        self.tracer = tracer
+        self._runs: Dict[Any, tuple] = {}
+
+    def _start(self, run_id: Any, metadata: Optional[Dict[str, Any]], prompt: Any) -> None:
+        if _current_span.get() is not None:
+            self._runs[run_id] = (time.perf_counter(), (metadata or {}).get("ls_model_name"), prompt)
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: Any, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        # One run per message list; the cache looks it up as dumps(messages)
+        self._start(run_id, metadata, messages[0])
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: Any, metadata: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        self._start(run_id, metadata, prompts[0])
+
+    @staticmethod
+    def _cached(span: NodeSpan, prompt: Any) -> bool:
+        # Serializing the prompt is only worth it when the node had cache hits
+        if not span.pending_cache_hits:
+            return False
+        return span.take_cache_hit(prompt_key(prompt if isinstance(prompt, str) else dumps(prompt)))
+
+    def on_llm_end(self, response: LLMResult, *, run_id: Any, **kwargs: Any) -> None:
+        started, model, prompt = self._runs.pop(run_id, (None, None, None))
+        span = _current_span.get()
+        if span is None or started is None:
+            return
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        llm_output = response.llm_output or {}
+        if not input_tokens and not output_tokens:
+            token_usage = llm_output.get("token_usage") or {}
+            input_tokens = token_usage.get("prompt_tokens", 0)
+            output_tokens = token_usage.get("completion_tokens", 0)
+        model = model or llm_output.get("model_name")
+        span.add_llm_call(time.perf_counter() - started, model, input_tokens, output_tokens, self.tracer.cost, self._cached(span, prompt))
+
+    def on_llm_error(self, error: BaseException, *, run_id: Any, **kwargs: Any) -> None:
+        self._runs.pop(run_id, None)
+
+
+class JsonlTraceSink:
+    """Appends one JSON line per node run; past ``max_bytes`` the file is rotated to ``<path>.1``."""
+
+    def __init__(self, path: str, max_bytes: Optional[int] = 50 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self.write_many([record])
+
+    def write_many(self, records: List[Dict[str, Any]]) -> None:
+        lines = "".join(json.dumps(record) + "\n" for record in records)
+        with self._lock:
+            if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+
+    def read(self, thread_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, "r", encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        return [r for r in records if thread_id is None or r["thread_id"] == thread_id]
+
+
+class SqliteTraceSink:
+    """Stores node runs in the ``node_traces`` table of a SQLite file (WAL, shared by processes).
+
+    Keeps at most ``max_rows`` runs, none older than ``max_age_days``; the oldest
+    are deleted after writes, at most once every ``prune_every`` seconds.
+    """
+
+    def __init__(self, path: str, max_rows: Optional[int] = 200_000, max_age_days: Optional[float] = 30, prune_every: float = 60.0):
+        self.path = path
+        self.max_rows = max_rows
+        self.max_age_days = max_age_days
+        self.prune_every = prune_every
+        self._pruned_at = 0.0
+        self._local = threading.local()
+        self._connection().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS node_traces (
+                ts TEXT, thread_id TEXT, node TEXT, agent TEXT, function TEXT,
+                wall_seconds REAL, throttle_seconds REAL, llm_seconds REAL, llm_calls INTEGER,
+                input_tokens INTEGER, output_tokens INTEGER, cache_hits INTEGER, cost_usd REAL,
+                models TEXT, speculation TEXT, error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS node_traces_thread ON node_traces (thread_id);
+            """
+        )
+        columns = {row[1] for row in self._connection().execute("PRAGMA table_info(node_traces)")}
+        if "speculation" not in columns:
+            # Trace files written before speculative research existed
+            self._connection().execute("ALTER TABLE node_traces ADD COLUMN speculation TEXT")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self.write_many([record])
+
+    def write_many(self, records: List[Dict[str, Any]]) -> None:
+        conn = self._connection()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                f"INSERT INTO node_traces ({', '.join(TRACE_FIELDS)}) VALUES ({', '.join('?' for _ in TRACE_FIELDS)})",
+                [[record[field] for field in TRACE_FIELDS] for record in records],
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        if time.time() - self._pruned_at >= self.prune_every:
+            self.prune()
+
+    def prune(self) -> None:
+        """Delete the runs beyond ``max_rows`` and those older than ``max_age_days``."""
+        self._pruned_at = time.time()
+        conn = self._connection()
+        if self.max_rows:
+            conn.execute("DELETE FROM node_traces WHERE rowid <= (SELECT MAX(rowid) FROM node_traces) - ?", (self.max_rows,))
+        if self.max_age_days:
+            conn.execute("DELETE FROM node_traces WHERE ts < ?", ((datetime.now() - timedelta(days=self.max_age_days)).isoformat(),))
+
+    def read(self, thread_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        query = f"SELECT {', '.join(TRACE_FIELDS)} FROM node_traces"
+        rows = self._connection().execute(
+            query + " WHERE thread_id = ?" if thread_id is not None else query,
+            (thread_id,) if thread_id is not None else (),
+        ).fetchall()
+        return [dict(zip(TRACE_FIELDS, row)) for row in rows]
+
+
+class BufferedTraceSink:
+    """Queues records in memory and writes them to ``sink`` in batches from a background thread.
+
+    Node runs only append to a list, so async nodes never wait on the disk; the
+    thread flushes every ``flush_interval`` seconds, or as soon as ``max_pending``
+    records wait. ``read`` and interpreter exit flush what is left.
+    """
+
+    def __init__(self, sink, flush_interval: float = 1.0, max_pending: int = 1000):
+        self.sink = sink
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        # Serializes flushes, so batches reach the sink in order
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        atexit.register(self.flush)
+
+    def write(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._pending.append(record)
+            full = len(self._pending) >= self.max_pending
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                records, self._pending = self._pending, []
+            if not records:
+                return
+            try:
+                self.sink.write_many(records)
+            except Exception as e:
+                # Tracing must never fail a meeting
+                logger.warning(f"Could not write {len(records)} trace records: {e}")
+
+    def read(self, thread_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        self.flush()
+        return self.sink.read(thread_id)
+
+
+def open_trace_sink(path: Optional[str], buffered: bool = True):
+    """JSONL sink for ``*.jsonl`` paths, SQLite otherwise; None (tracing off) for "" or "off".
+
+    SQLite retention comes from TRACE_MAX_ROWS and TRACE_MAX_AGE_DAYS (0 keeps everything).
+    """
+    if not path or path == "off":
+        return None
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if path.endswith(".jsonl"):
+        sink = JsonlTraceSink(path)
+    else:
+        sink = SqliteTraceSink(
+            path,
+            max_rows=int(os.getenv("TRACE_MAX_ROWS", "200000")),
+            max_age_days=float(os.getenv("TRACE_MAX_AGE_DAYS", "30")),
+        )
+    return BufferedTraceSink(sink) if buffered else sink
+
+
+class NodeTracer:
+    """Times graph nodes and writes one record per node run to ``sink``.
+
+    ``wrap``/``awrap`` turn a node function into one that opens a NodeSpan for
+    the run. While it is open, every model call made by the node reports its
+    latency and tokens through TraceCallbackHandler, and the rate limiter,
+    provider semaphore and LLM cache report throttling and cache hits through
+    record_throttle/record_cache_hit. ``prices`` maps a model name to USD per
+    million ``input`` and ``output`` tokens, for the cost estimate.
+
+    With ``path`` instead of ``sink``, the sink is opened (open_trace_sink) the
+    first time it is needed, so importing the tracer creates no files.
+    """
+
+    def __init__(self, sink=None, prices: Optional[Dict[str, Dict[str, float]]] = None, path: Optional[str] = None):
+        self._sink = sink
+        self.path = path
+        self._sink_lock = threading.Lock()
+        self.prices = prices or {}
+        self.handler = TraceCallbackHandler(self)
+
+    @property
+    def sink(self):
+        if self._sink is None and self.path is not None:
+            with self._sink_lock:
+                if self._sink is None and self.path is not None:
+                    self._sink, self.path = open_trace_sink(self.path), None
+        return self._sink
+
+    @sink.setter
+    def sink(self, sink) -> None:
+        self._sink, self.path = sink, None
+
+    def cost(self, model: Optional[str], input_tokens: int, output_tokens: int) -> float:
+        price = self.prices.get(model or "")
+        if price is None:
+            # Dated snapshots (gpt-4o-2024-08-06) fall back to their base model
+            price = next((p for name, p in self.prices.items() if model and model.startswith(f"{name}-")), None)
+        if price is None:
+            return 0.0
+        return (input_tokens * price.get("input", 0.0) + output_tokens * price.get("output", 0.0)) / 1_000_000
+
+    def _open(self, func: Callable, config: Optional[Dict[str, Any]]) -> tuple:
+        config = config or {}
+        node = config.get("metadata", {}).get("langgraph_node") or func.__name__
+        agent = getattr(getattr(func, "__self__", None), "name", None)
+        thread_id = config.get("configurable", {}).get("thread_id")
+        span = NodeSpan(node, agent, func.__name__, str(thread_id) if thread_id is not None else None)
+        return span, _current_span.set(span), _trace_handler.set(self.handler)
+
+    def _close(self, span: NodeSpan, tokens: tuple, error: Optional[BaseException]) -> None:
+        _trace_handler.reset(tokens[1])
+        _current_span.reset(tokens[0])
+        try:
+            self.sink.write(span.record(error))
+        except Exception as e:
+            # Tracing must never fail a meeting
+            logger.warning(f"Could not write trace of {span.node}: {e}")
+
+    def wrap(self, func: Callable) -> Callable:
+        if self.sink is None:
+            return func
+
+        # No functools.wraps: RunnableLambda must see the config parameter, not func's signature
+        def traced(state, config=None):
+            span, *tokens = self._open(func, config)
+            error = None
+            try:
+                return func(state)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                self._close(span, tokens, error)
+        traced.__name__ = func.__name__
+        return traced
+
+    def awrap(self, afunc: Callable) -> Callable:
+        if self.sink is None:
+            return afunc
+
+        async def traced(state, config=None):
+            span, *tokens = self._open(afunc, config)
+            error = None
+            try:
+                return await afunc(state)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                self._close(span, tokens, error)
+        traced.__name__ = afunc.__name__
+        return traced
+
+
+def summarize_traces(records: List[Dict[str, Any]], by: str = "node") -> List[Dict[str, Any]]:
+    """Totals per ``by`` (node, agent or function), most expensive in wall time first."""
+    groups: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        key = record.get(by) or "-"
+        group = groups.setdefault(key, {
+            by: key, "runs": 0, "errors": 0, "wall_seconds": 0.0, "max_wall_seconds": 0.0,
+            "throttle_seconds": 0.0, "llm_seconds": 0.0, "llm_calls": 0, "cache_hits": 0,
+            "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0, "speculations": 0, "speculations_used": 0,
+        })
+        group["runs"] += 1
+        group["errors"] += bool(record.get("error"))
+        group["speculations"] += bool(record.get("speculation"))
+        group["speculations_used"] += record.get("speculation") == "used"
+        group["max_wall_seconds"] = max(group["max_wall_seconds"], record["wall_seconds"])
+        for field in ("wall_seconds", "throttle_seconds", "llm_seconds", "llm_calls", "cache_hits", "input_tokens", "output_tokens", "cost_usd"):
+            group[field] += record[field] or 0
+    summary = sorted(groups.values(), key=lambda g: g["wall_seconds"], reverse=True)
+    for group in summary:
+        group["mean_wall_seconds"] = group["wall_seconds"] / group["runs"]
+        group["cache_hit_rate"] = group["cache_hits"] / group["llm_calls"] if group["llm_calls"] else 0.0
+        group["speculation_hit_rate"] = group["speculations_used"] / group["speculations"] if group["speculations"] else 0.0
+    return summary
@@ -0,0 +1,283 @@
+"""Full meetings on synthetic organisations, offline and deterministic.
+
+A fake chat provider ("FAKE", added with agent_base.register_provider) answers
+every structured decision from a script and waits for a latency drawn from a
+seeded distribution, so no request ever leaves the machine. For each org size
+a prompt tree with 1 CEO, D directors and the remaining executives is generated
+from the templates in Data/Prompts, and one meeting of ``--rounds`` CEO rounds
+is run per repeat:
+
+    - build:     StateMachines construction (agents, state schema, graph compile)
+    - overhead:  wall time per graph step and per LLM call with zero LLM latency,
+                 i.e. everything the framework does around the model calls
+    - ckpt:      checkpoint bytes written per meeting (rows, blobs and writes)
+    - e2e:       wall time of the meeting with the injected latency
+
+Run from the repository root:
+    python benchmarks/graph_benchmark.py --agents 3 10 25 50 --rounds 2 --latency-ms 50 --jitter lognormal
+
+``--graph departments`` runs every department as its own subgraph
+(StateMachines(department_subgraphs=True)); ``--graph both`` compares it with
+the flat graph. Department steps run inside one top-level step, so compare the
+two on ms/call rather than ms/step. ``--speculative-research`` lets executives
+prefetch assistant answers while they decide; the hit rate is printed after the table.
+A prefetch is only used when the executive asks the question it was made for,
+and the scripted executives never repeat one, so expect a 0% hit rate here.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+WORK_DIR = tempfile.mkdtemp(prefix="graph_benchmark_")
+# Keep every store of the run out of .cache; no traces unless asked for
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(WORK_DIR, "llm_cache.sqlite"))
+os.environ.setdefault("MEETING_ARCHIVE_PATH", os.path.join(WORK_DIR, "archive.jsonl"))
+os.environ.setdefault("TRACE_PATH", "off")
+# Fake models answer instantly; a semantic cache would need real embeddings
+os.environ.setdefault("SEMANTIC_CACHE", "off")
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+import agents.agent_base as agent_base
+import agents.token_window as token_window
+from agents.agents_graph_V2 import StateMachines
+from agents.batch_runner import TokenUsageCallback
+from agents.tracing import speculation_stats
+
+TEMPLATE_AGENTS = {1: "Nexus", 2: "supervisor1", 3: "director"}
+FAKE_MODEL = "fake-chat"
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model answering structured decisions from a per-agent script.
+
+    Agents are told apart by the ``agent`` param (it is part of the client pool
+    key, so every agent gets its own instance and its own script position).
+    Decisions with a bound tool get a tool call for it; anything else gets a
+    short text answer.
+    """
+
+    model: str = FAKE_MODEL
+    agent: str = ""
+    latency_ms: float = 0.0
+    jitter: str = "none"
+    seed: int = 0
+    research_steps: int = 1
+    ceo_rounds: int = 1
+    # Scripted answers must not come back from the shared LLM cache
+    cache: Optional[bool] = False
+
+    _rng: Any = PrivateAttr(default=None)
+    _calls: Dict[str, int] = PrivateAttr(default_factory=dict)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _latency(self) -> float:
+        if self._rng is None:
+            self._rng = random.Random(self.seed + zlib.crc32(self.agent.encode()))
+        base = self.latency_ms / 1000.0
+        if self.jitter == "uniform":
+            return self._rng.uniform(0.5 * base, 1.5 * base)
+        if self.jitter == "lognormal":
+            # Median ``latency_ms`` with the long tail of real API latencies
+            return base * self._rng.lognormvariate(0.0, 0.5)
+        return base
+
+    def _decision(self, name: str) -> Dict[str, Any]:
+        n = self._calls.get(name, 0)
+        self._calls[name] = n + 1
+        if name == "Level1Decision":
+            decision = "search_more_information" if n % (self.research_steps + 1) < self.research_steps else "converse_with_superiors"
+            return {"reasoning": "scripted", "decision": decision, "content": f"{self.agent} finding {n}"}
+        if name == "Level2Decision":
+            decision = "break_down_for_executives" if n % 2 == 0 else "aggregate_for_ceo"
+            return {"reasoning": "scripted", "decision": decision, "content": [f"{self.agent} summary {n}"]}
+        decision = "communicate_with_directors" if n < self.ceo_rounds else "end"
+        return {"reasoning": "scripted", "decision": decision, "content": [f"{self.agent} directive {n}"]}
+
+    def _reply(self, messages, tools: Optional[List[Dict[str, Any]]]) -> ChatResult:
+        usage = {"input_tokens": sum(len(str(m.content)) // 4 for m in messages), "output_tokens": 20}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        names = [tool["function"]["name"] for tool in tools or []]
+        name = next((n for n in names if n in ("Level1Decision", "Level2Decision", "CEODecision")), None)
+        if name is None:
+            message = AIMessage(content=f"{self.agent} research notes", usage_metadata=usage)
+        else:
+            message = AIMessage(content="", tool_calls=[{"name": name, "args": self._decision(name), "id": f"call_{name}"}], usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, **kwargs) -> ChatResult:
+        time.sleep(self._latency())
+        return self._reply(messages, tools)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, tools=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self._latency())
+        return self._reply(messages, tools)
+
+
+def org_shape(agents: int) -> List[int]:
+    """Executives per director for an org of ``agents`` (CEO included), about 1 director per 6 executives."""
+    directors = max(1, (agents - 1) // 7)
+    executives = max(1, agents - 1 - directors)
+    return [executives // directors + (i < executives % directors) for i in range(directors)]
+
+
+def build_prompt_dir(root: str, agents: int, llm_config: Dict[str, Any]) -> str:
+    """Write a Data/Prompts-like tree for a synthetic org and return its path."""
+    prompt_dir = os.path.join(root, f"org_{agents}")
+    shutil.rmtree(prompt_dir, ignore_errors=True)
+
+    def add_agent(level: int, name: str, **extra: Any) -> None:
+        source = os.path.join(REPO_ROOT, "Data", "Prompts", f"level{level}", TEMPLATE_AGENTS[level])
+        target = os.path.join(prompt_dir, f"level{level}", name)
+        shutil.copytree(source, target, ignore=shutil.ignore_patterns("config.json"))
+        with open(os.path.join(target, "config.json"), "w") as f:
+            json.dump({
+                "llm_model": FAKE_MODEL,
+                "llm_config": {**llm_config, "agent": name},
+                "assistant_llm_model": FAKE_MODEL,
+                "assistant_llm_config": {**llm_config, "agent": f"assistant_{name}"},
+                **extra,
+            }, f)
+
+    add_agent(3, "ceo")
+    for d, executives in enumerate(org_shape(agents)):
+        director = f"director_{d:02d}"
+        names = [f"executive_{d:02d}_{e:02d}" for e in range(executives)]
+        add_agent(2, director, subordinates=names)
+        for name in names:
+            add_agent(1, name, supervisor_name=director)
+    return prompt_dir
+
+
+def checkpoint_bytes(database_path: str) -> Dict[str, int]:
+    conn = sqlite3.connect(database_path)
+    try:
+        steps, rows = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints").fetchone()
+        blobs = conn.execute("SELECT COALESCE(SUM(LENGTH(blob)), 0) FROM checkpoint_blobs").fetchone()[0]
+        writes = conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM writes").fetchone()[0]
+    finally:
+        conn.close()
+    return {"steps": steps, "bytes": rows + blobs + writes}
+
+
+def run_meeting(prompt_dir: str, tag: str, mode: str, departments: bool = False, speculative: bool = False) -> Dict[str, Any]:
+    database_path = os.path.join(WORK_DIR, f"checkpoints_{tag}.sqlite")
+    start = time.perf_counter()
+    state_machines = StateMachines(prompt_dir, interrupt_graph_before=False, checkpoint_path=database_path,
+                                   department_subgraphs=departments, speculative_research=speculative)
+    build = time.perf_counter() - start
+    # Keep every checkpoint so the byte count covers the whole meeting
+    state_machines.memory.keep_last = None
+    state_machines.config["recursion_limit"] = 100_000
+    usage = TokenUsageCallback()
+    state_machines.config["callbacks"] = [usage]
+    initial_state = {"news_insights": ["Synthetic benchmark insight."], "digest": [""], "ceo_messages": [], "ceo_mode": ["research_information"]}
+
+    start = time.perf_counter()
+    if mode == "async":
+        asyncio.run(state_machines.astart(initial_state))
+    else:
+        state_machines.start(initial_state)
+    e2e = time.perf_counter() - start
+    return {"build": build, "e2e": e2e, "llm_calls": usage.usage()["llm_calls"], **checkpoint_bytes(database_path)}
+
+
+def benchmark_org(agents: int, args: argparse.Namespace, graph: str) -> Dict[str, Any]:
+    script = {"research_steps": args.research_steps, "ceo_rounds": args.rounds, "seed": args.seed}
+    zero = build_prompt_dir(WORK_DIR, agents, {**script, "latency_ms": 0.0})
+    timed = build_prompt_dir(os.path.join(WORK_DIR, "timed"), agents, {**script, "latency_ms": args.latency_ms, "jitter": args.jitter})
+    departments = graph == "departments"
+    builds, overheads, e2es = [], [], []
+    for repeat in range(args.repeats):
+        # Fresh clients (and scripts) for every meeting
+        agent_base.llm_client_pool.clear()
+        run = run_meeting(zero, f"{agents}_{graph}_zero_{repeat}", args.mode, departments, args.speculative_research)
+        builds.append(run["build"])
+        overheads.append(run["e2e"])
+        agent_base.llm_client_pool.clear()
+        e2es.append(run_meeting(timed, f"{agents}_{graph}_timed_{repeat}", args.mode, departments, args.speculative_research)["e2e"])
+    return {
+        "graph": graph,
+        "agents": agents,
+        "directors": len(org_shape(agents)),
+        "steps": run["steps"],
+        "llm_calls": run["llm_calls"],
+        "build_seconds": statistics.median(builds),
+        "overhead_ms_per_step": statistics.median(overheads) / run["steps"] * 1000,
+        "overhead_ms_per_call": statistics.median(overheads) / max(run["llm_calls"], 1) * 1000,
+        "checkpoint_bytes": run["bytes"],
+        "checkpoint_bytes_per_step": run["bytes"] / run["steps"],
+        "e2e_seconds": statistics.median(e2es),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, nargs="+", default=[3, 10, 25, 50], help="Org sizes, CEO included")
+    parser.add_argument("--rounds", type=int, default=2, help="CEO rounds with the directors before ending")
+    parser.add_argument("--research-steps", type=int, default=1, help="Assistant round trips per executive turn")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Median fake LLM latency for the e2e run")
+    parser.add_argument("--jitter", choices=["none", "uniform", "lognormal"], default="lognormal")
+    parser.add_argument("--mode", choices=["async", "sync"], default="async")
+    parser.add_argument("--graph", choices=["flat", "departments", "both"], default="both", help="Flat graph, one subgraph per department, or both")
+    parser.add_argument("--speculative-research", action="store_true", help="Executives prefetch assistant answers while deciding")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--provider-concurrency", type=int, default=16, help="In-flight async calls to the fake provider")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    agent_base.register_provider("FAKE", ScriptedChatModel.__module__, "ScriptedChatModel", models=[FAKE_MODEL])
+    agent_base.rate_limit_scheduler.limits["FAKE"] = {"default": {"requests_per_minute": 1e9, "max_burst": 10**6}}
+    agent_base.PROVIDER_CONCURRENCY["FAKE"] = args.provider_concurrency
+    # Approximate token counts: tiktoken would download its encoding
+    token_window._counter = lambda text: len(text) // 4 + 1
+
+    try:
+        graphs = ["flat", "departments"] if args.graph == "both" else [args.graph]
+        results = [benchmark_org(agents, args, graph) for agents in args.agents for graph in graphs]
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.rounds} CEO rounds, {args.mode}, e2e at {args.latency_ms:.0f} ms {args.jitter} latency, median of {args.repeats}")
+    print(f"{'graph':>11} {'agents':>6} {'dirs':>4} {'steps':>5} {'calls':>5} {'build s':>8} {'ms/step':>8} {'ms/call':>8} {'ckpt KB':>8} {'KB/step':>8} {'e2e s':>7}")
+    for r in results:
+        print(
+            f"{r['graph']:>11} {r['agents']:>6} {r['directors']:>4} {r['steps']:>5} {r['llm_calls']:>5} {r['build_seconds']:>8.3f} "
+            f"{r['overhead_ms_per_step']:>8.2f} {r['overhead_ms_per_call']:>8.2f} "
+            f"{r['checkpoint_bytes'] / 1024:>8.1f} {r['checkpoint_bytes_per_step'] / 1024:>8.2f} {r['e2e_seconds']:>7.2f}"
+        )
+    if args.speculative_research:
+        stats = speculation_stats()
+        print(f"speculative research: {stats['used']} used, {stats['discarded']} discarded ({stats['hit_rate']:.0%} hit rate)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Per-step overhead of the structured decision calls, without network time.
+
+The chat model is a real ChatOpenAI whose HTTP client answers locally with a
+canned tool call (httpx.MockTransport), so the timings cover everything the node
+does in-process: building the structured runnable, formatting the request and
+parsing the reply.
+
+    - rebuild: ``llm.with_structured_output(schema)`` on every step (old nodes)
+    - cached:  ``agent.structured_llm(schema)``, built once per agent and schema
+
+Run from the repository root:
+    python benchmarks/node_overhead_benchmark.py --steps 200
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_openai import ChatOpenAI
+
+from agents.agent_base import BaseAgent
+from agents.agents_graph_V2 import CEODecision, Level1Decision, Level2Decision
+
+CANNED_ARGUMENTS = {
+    "Level1Decision": {"reasoning": "r", "decision": "converse_with_superiors", "content": "report"},
+    "Level2Decision": {"reasoning": "r", "decision": "aggregate_for_ceo", "content": ["summary"]},
+    "CEODecision": {"reasoning": "r", "decision": "write_to_digest", "content": ["note"]},
+}
+
+
+def fake_openai(request: httpx.Request) -> httpx.Response:
+    body = json.loads(request.content)
+    name = body["tools"][0]["function"]["name"]
+    return httpx.Response(200, json={
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": 0,
+        "model": body["model"],
+        "choices": [{
+            "index": 0,
+            "finish_reason": "tool_calls",
+            "message": {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{
+                    "id": "call_bench",
+                    "type": "function",
+                    "function": {"name": name, "arguments": json.dumps(CANNED_ARGUMENTS[name])},
+                }],
+            },
+        }],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120},
+    })
+
+
+class BenchAgent(BaseAgent):
+    def __init__(self, llm):
+        self.llm = llm
+        self._structured_llms = {}
+
+
+def time_steps(step, steps: int) -> float:
+    samples = []
+    for _ in range(steps):
+        start = time.perf_counter()
+        step()
+        samples.append(time.perf_counter() - start)
+    return statistics.mean(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=200)
+    args = parser.parse_args()
+
+    llm = ChatOpenAI(
+        model_name="gpt-3.5-turbo",
+        api_key="sk-benchmark",
+        cache=False,
+        http_client=httpx.Client(transport=httpx.MockTransport(fake_openai)),
+    )
+    agent = BenchAgent(llm)
+    messages = [SystemMessage(content="You are an agent."), HumanMessage(content="Decide the next step. " * 50)]
+
+    print(f"{'schema':<16}{'build (us)':>12}{'rebuild step (us)':>20}{'cached step (us)':>19}{'saved':>8}")
+    for schema in (Level1Decision, Level2Decision, CEODecision):
+        build = time_steps(lambda: llm.with_structured_output(schema), args.steps)
+        rebuild = time_steps(lambda: llm.with_structured_output(schema).invoke(messages), args.steps)
+        cached = time_steps(lambda: agent.structured_llm(schema).invoke(messages), args.steps)
+        print(
+            f"{schema.__name__:<16}{build * 1e6:>12.0f}{rebuild * 1e6:>20.0f}{cached * 1e6:>19.0f}"
+            f"{(rebuild - cached) / rebuild:>8.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Cold-start cost of agents.agent_base with lazy vs eager provider imports.
+
+Each sample runs in a fresh interpreter:
+    - lazy:  import agents.agent_base, then build one agent LLM (gpt-3.5-turbo),
+             which imports only langchain_openai
+    - eager: import every installed provider package first, as agent_base used to
+
+Run from the repository root:
+    python benchmarks/startup_benchmark.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE = """
+import importlib, json, time
+start = time.perf_counter()
+if {eager}:
+    from agents.agent_base import LLM_PROVIDERS as _providers
+    for module, _, _ in list(_providers.values()):
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+import agents.agent_base as agent_base
+imported = time.perf_counter()
+provider = agent_base.get_llm_provider({model!r})
+agent_base.get_chat_model_class(provider)
+ready = time.perf_counter()
+print(json.dumps({{"import": imported - start, "first_llm": ready - start}}))
+"""
+
+
+def run_sample(eager: bool, model: str) -> dict:
+    env = {**os.environ, "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "sk-benchmark")}
+    output = subprocess.run(
+        [sys.executable, "-c", SAMPLE.format(eager=eager, model=model)],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--model", default="gpt-3.5-turbo")
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ("eager", "lazy"):
+        samples = [run_sample(mode == "eager", args.model) for _ in range(args.runs)]
+        results[mode] = {key: statistics.median(s[key] for s in samples) for key in ("import", "first_llm")}
+
+    print(f"{'mode':<8}{'import (ms)':>14}{'first llm (ms)':>18}")
+    for mode, timing in results.items():
+        print(f"{mode:<8}{timing['import'] * 1000:>14.1f}{timing['first_llm'] * 1000:>18.1f}")
+    saved = results["eager"]["first_llm"] - results["lazy"]["first_llm"]
+    print(f"\nLazy provider loading saves {saved * 1000:.1f} ms per process (median of {args.runs} runs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,219 @@
-s
\ No newline at end of file
+"""Headless entrypoint: run one meeting per input without the Streamlit UI.
+
+Inputs are a directory of documents (.txt, .md, .json articles), a JSONL file
+(one object per line with ``text`` or ``source`` and an optional ``id``) or a
+JSON list of sources such as s3_links.json. The graph runs without interrupts
+and every finished meeting is appended to the output JSONL as soon as it ends.
+
+    python main.py articles/ --output results.jsonl --workers 4 --concurrency 4
+    python main.py inputs.jsonl --output results.jsonl --resume
+
+``--workers`` processes each run ``--concurrency`` meetings at a time; they
+share the checkpoint database, the message archive and the LLM response cache.
+"""
+from typing import Any, Dict, List, Optional, Set
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+INPUT_SUFFIXES = (".txt", ".md", ".json")
+# Keys a JSONL input may carry its insight text under
+TEXT_KEYS = ("text", "insight", "news_insight", "article_body")
+
+logger = logging.getLogger("main")
+
+
+def setup_logging(level: str) -> None:
+    logging.basicConfig(
+        level=getattr(logging, level.upper()),
+        format='%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s',
+        stream=sys.stderr,
+    )
+
+
+def read_inputs(path: str) -> List[Dict[str, Any]]:
+    """Input records (``id`` plus ``text`` or ``source``) from a directory, a JSONL file or a source list."""
+    if os.path.isdir(path):
+        records = []
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for file_name in sorted(files):
+                if file_name.endswith(INPUT_SUFFIXES):
+                    file_path = os.path.join(root, file_name)
+                    records.append({"id": os.path.relpath(file_path, path), "source": file_path})
+        return records
+
+    if path.endswith(".jsonl"):
+        records = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                if isinstance(data, str):
+                    data = {"text": data}
+                record = {"id": str(data.get("id", f"{os.path.basename(path)}:{line_number}"))}
+                text_key = next((key for key in TEXT_KEYS if key in data), None)
+                if text_key is not None:
+                    record["text"] = data[text_key]
+                elif "source" in data:
+                    record["source"] = data["source"]
+                else:
+                    raise ValueError(f"{path}:{line_number} has neither a text nor a source")
+                records.append(record)
+        return records
+
+    from agents.batch_runner import expand_sources
+    return [{"id": source, "source": source} for source in expand_sources([path])]
+
+
+def done_ids(output_path: str) -> Set[str]:
+    """Ids already written to ``output_path`` by an earlier run (failed meetings are retried)."""
+    ids = set()
+    if os.path.exists(output_path):
+        with open(output_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Line cut short by a crash
+                if result.get("status") != "failed" and "id" in result:
+                    ids.add(str(result["id"]))
+    return ids
+
+
+def build_batch(settings: Dict[str, Any]):
+    from agents.agents_graph_V2 import StateMachines
+    from agents.batch_runner import MeetingBatch
+    state_machines = StateMachines(
+        settings["prompt_dir"],
+        interrupt_graph_before=False,
+        checkpoint_path=settings["checkpoint_db"],
+        department_subgraphs=settings["department_subgraphs"],
+        speculative_research=settings["speculative_research"],
+    )
+    return MeetingBatch(state_machines, concurrency=settings["concurrency"], recursion_limit=settings["recursion_limit"])
+
+
+def worker(index: int, records: List[Dict[str, Any]], settings: Dict[str, Any], results: "multiprocessing.Queue") -> None:
+    """Worker process: run its share of the meetings and send every result back to the writer."""
+    setup_logging(settings["log_level"])
+    try:
+        build_batch(settings).run(records, on_result=lambda result: results.put(("result", result)))
+    finally:
+        results.put(("done", index))
+
+
+def write_result(output, result: Dict[str, Any]) -> None:
+    output.write(json.dumps(result, default=str) + "\n")
+    output.flush()
+
+
+def run(records: List[Dict[str, Any]], output, settings: Dict[str, Any], workers: int) -> List[Dict[str, Any]]:
+    """Run every record, writing results to ``output`` as they finish; return them all."""
+    written = []
+
+    def collect(result: Dict[str, Any]) -> None:
+        write_result(output, result)
+        written.append(result)
+
+    if workers <= 1:
+        build_batch(settings).run(records, on_result=collect)
+        return written
+
+    # spawn: the parent already runs threads (event loop, pools) that fork would copy in a broken state
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(i, records[i::workers], settings, results), name=f"worker-{i}")
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    running = set(range(workers))
+    while running:
+        try:
+            kind, payload = results.get(timeout=1.0)
+        except queue.Empty:
+            # A worker killed before it could report is done too
+            for i in list(running):
+                if not processes[i].is_alive() and results.empty():
+                    logger.error(f"worker-{i} exited with code {processes[i].exitcode}")
+                    running.discard(i)
+            continue
+        if kind == "result":
+            collect(payload)
+        else:
+            running.discard(payload)
+    for process in processes:
+        process.join()
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run agent meetings headlessly and stream the results to JSONL.")
+    parser.add_argument("input", help="Directory of documents, JSONL of inputs, or JSON list of sources (e.g. s3_links.json)")
+    parser.add_argument("--output", "-o", default="results.jsonl", help="JSONL file receiving one result per meeting")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes")
+    parser.add_argument("--concurrency", type=int, default=4, help="Meetings in flight per worker")
+    parser.add_argument("--limit", type=int, default=None, help="Only run the first N inputs")
+    parser.add_argument("--resume", action="store_true", help="Append to --output and skip inputs it already holds")
+    parser.add_argument("--prompt-dir", default="Data/Prompts")
+    parser.add_argument("--checkpoint-db", default=None, help="Checkpoint database (default: CHECKPOINT_DB_PATH)")
+    parser.add_argument("--recursion-limit", type=int, default=250)
+    parser.add_argument("--department-subgraphs", action="store_true", help="Run each department as its own subgraph (large orgs)")
+    parser.add_argument("--speculative-research", action="store_true", help="Prefetch assistant research while executives decide")
+    parser.add_argument("--report", default=None, help="Also write the throughput report to this JSON file")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+    setup_logging(args.log_level)
+
+    records = read_inputs(args.input)[:args.limit]
+    if args.resume:
+        skip = done_ids(args.output)
+        records = [record for record in records if record["id"] not in skip]
+        logger.info(f"Skipping {len(skip)} inputs already in {args.output}")
+    if not records:
+        logger.info("Nothing to run")
+        return 0
+
+    settings = {
+        "prompt_dir": args.prompt_dir,
+        "checkpoint_db": args.checkpoint_db,
+        "concurrency": args.concurrency,
+        "recursion_limit": args.recursion_limit,
+        "department_subgraphs": args.department_subgraphs,
+        "speculative_research": args.speculative_research,
+        "log_level": args.log_level,
+    }
+    workers = max(1, min(args.workers, len(records)))
+    logger.info(f"Running {len(records)} meetings on {workers} worker(s) x {args.concurrency}")
+
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    start = time.perf_counter()
+    with open(args.output, "a" if args.resume else "w", encoding="utf-8") as output:
+        results = run(records, output, settings, workers)
+
+    from agents.batch_runner import throughput_report
+    report = {**throughput_report(results, time.perf_counter() - start), "workers": workers, "concurrency": args.concurrency}
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    logger.info(
+        f"{report['meetings']} meetings ({report['failed']} failed) in {report['wall_seconds']:.0f}s: "
+        f"{report['meetings_per_hour']:.1f} meetings/hour, {report['tokens_per_meeting']:.0f} tokens/meeting"
+    )
+    missing = len(records) - len(results)
+    if missing:
+        logger.error(f"{missing} meetings produced no result")
+    return 1 if missing or report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,8 @@
 import streamlit as st
-from agents.agents_graph_V2 import StateMachines
+from agents.agents_graph_V2 import StateMachines, get_state_machine
+from agents.message_archive import archive_marker
+from agents.agent_base import node_tracer
+from agents.tracing import summarize_traces
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 import PyPDF2
 import json
@@ -254,17 +257,21 @@ def render_conversation_state():
     # Place buttons horizontally and centered
     col1, col2, col3 = st.columns([1, 1, 1])
     with col1:
-        if st.button("Continue", key="btn_continue"):
-            handle_continue()
+        continue_clicked = st.button("Continue", key="btn_continue")
     with col2:
-        if st.button("Retry", key="btn_retry"):
-            handle_retry()
+        retry_clicked = st.button("Retry", key="btn_retry")
     with col3:
         if st.button("Reset", key="btn_reset"):
             handle_reset()
 
     st.markdown('</div>', unsafe_allow_html=True)
 
+    # Run outside the button columns so the round streams at full width
+    if continue_clicked:
+        handle_continue()
+    if retry_clicked:
+        handle_retry()
+
     # Render columns for conversation messages
     cols = st.columns(2)
 
@@ -283,19 +290,63 @@ def render_conversation_state():
         else:
             st.info("No conversation elements available.")
 
+    render_trace_summary()
+
+def render_trace_summary():
+    """Where this meeting spent its time, tokens and money, per agent or per graph node."""
+    if node_tracer.sink is None:
+        return
+    with st.expander("Performance"):
+        records = node_tracer.sink.read(st.session_state.thread_id)
+        if not records:
+            st.info("No traced node runs for this meeting yet.")
+            return
+        total_cost = sum(r["cost_usd"] for r in records)
+        total_tokens = sum(r["input_tokens"] + r["output_tokens"] for r in records)
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Node runs", len(records))
+        col2.metric("Tokens", f"{total_tokens:,}")
+        col3.metric("Estimated cost", f"${total_cost:.4f}")
+        by = st.radio("Group by", ["agent", "node"], horizontal=True, key="trace_group_by")
+        st.dataframe(summarize_traces(records, by=by), use_container_width=True)
+
+def message_content(msg) -> str:
+    # Extract content based on message type
+    if isinstance(msg, (HumanMessage, AIMessage, SystemMessage)):
+        return msg.content
+    elif isinstance(msg, dict):
+        return msg.get('content', str(msg))
+    elif hasattr(msg, 'content'):
+        return msg.content
+    return str(msg)
+
+def render_archived_messages(key, marker):
+    """Page through the messages the windowed reducers moved out of the state."""
+    pages_key = f"archive_pages_{key}"
+    shown_pages = st.session_state.get(pages_key, 0)
+    with st.expander(f"Earlier messages ({marker['count']} archived)", expanded=shown_pages > 0):
+        archive = st.session_state.state_machine.archive
+        pages, offset = [], marker["offset"]
+        while offset is not None and len(pages) < shown_pages:
+            page, offset = archive.read(offset)
+            pages.append(page)
+        # Pages come newest first; show them in chronological order
+        for page in reversed(pages):
+            for msg in page:
+                st.markdown(f"{message_content(msg)}")
+                st.markdown("---")
+        if offset is not None and st.button("Load older messages", key=f"load_older_{key}"):
+            st.session_state[pages_key] = shown_pages + 1
+            st.rerun()
+
 def render_conversation_messages(key, only_content=False):
     if key in st.session_state.current_state:
         messages = st.session_state.current_state[key]
+        marker = archive_marker(messages)
+        if marker:
+            render_archived_messages(key, marker)
         for i, msg in enumerate(messages):
-            # Extract content based on message type
-            if isinstance(msg, (HumanMessage, AIMessage, SystemMessage)):
-                content = msg.content
-            elif isinstance(msg, dict):
-                content = msg.get('content', str(msg))
-            elif hasattr(msg, 'content'):
-                content = msg.content
-            else:
-                content = str(msg)
+            content = message_content(msg)
 
             # Display the message content without any extra styling or borders
             st.markdown(f"{content}")
@@ -303,15 +354,44 @@ def render_conversation_messages(key, only_content=False):
             # Optionally, add a horizontal line between messages
             st.markdown("---")
 
-# Add caching for the state machine
-
-#@st.cache_resource
+def stream_round(events):
+    """Render a graph round as it runs and return the state it stopped at.
+
+    New meeting_simulation messages are appended as soon as their node finishes,
+    and the tokens of the LLM calls still running are shown live below them.
+    """
+    st.markdown('<div class="column-header">Meeting Simulation (live)</div>', unsafe_allow_html=True)
+    meeting = st.container()
+    status = st.empty()
+    live = st.empty()
+    running_tokens = {}
+    final_state = None
+    for event in events:
+        if event["type"] == "node_start":
+            status.caption(f"Running {event['node']}...")
+        elif event["type"] == "token":
+            running_tokens[event["node"]] = running_tokens.get(event["node"], "") + event["text"]
+            live.markdown("\n\n".join(f"**{node}**: {text}" for node, text in running_tokens.items()))
+        elif event["type"] == "node_end":
+            running_tokens.pop(event["node"], None)
+            live.markdown("\n\n".join(f"**{node}**: {text}" for node, text in running_tokens.items()))
+            for msg in event["update"].get("meeting_simulation", []):
+                meeting.markdown(f"{message_content(msg)}")
+                meeting.markdown("---")
+        elif event["type"] == "state":
+            final_state = event["state"]
+    status.empty()
+    live.empty()
+    return final_state
 
 def get_shared_state_machine(interrupt_before: bool = True):
-    """Create a single StateMachine instance shared across all sessions"""
-    logger.info(f"Creating new shared StateMachine instance with interrupt_before={interrupt_before}")
+    """Return the process-wide StateMachine shared across all sessions.
+
+    The compiled graph is rebuilt only when a file under Data/Prompts changes;
+    sessions keep their conversations apart through their own thread_id.
+    """
     prompts_dir = os.path.join("Data", "Prompts")
-    return StateMachines(str(prompts_dir).strip(), interrupt_before)
+    return get_state_machine(str(prompts_dir).strip(), interrupt_before)
 
 def initialize_state_machine():
     with st.spinner("Initializing state machine..."):
@@ -320,7 +400,9 @@ def initialize_state_machine():
             interrupt_before = st.session_state.get('interrupt_before', True)
             # Use the shared cached instance with interrupt_before parameter
             st.session_state.state_machine = get_shared_state_machine(interrupt_before)
-            logger.info(f"Using shared state machine instance with interrupt_before={interrupt_before}")
+            if "thread_id" not in st.session_state:
+                st.session_state.thread_id = StateMachines.new_thread_id()
+            logger.info(f"Using shared state machine instance with interrupt_before={interrupt_before}, thread_id={st.session_state.thread_id}")
             st.success("State machine initialized successfully!")
         except Exception as e:
             handle_error("Failed to initialize state machine", e)
@@ -330,6 +412,7 @@ def initialize_conversation(content, interrupt_before: bool):
         try:
             # Store interrupt_before in session state
             st.session_state.interrupt_before = interrupt_before
+            st.session_state.state_machine = get_shared_state_machine(interrupt_before)
             
             initial_state = {
                 "news_insights": [content],
@@ -338,7 +421,7 @@ def initialize_conversation(content, interrupt_before: bool):
                 "ceo_mode": ["research_information"]
             }
             
-            result = st.session_state.state_machine.start(initial_state)
+            result = stream_round(st.session_state.state_machine.stream_start(initial_state, thread_id=st.session_state.thread_id))
             if result is None:
                 st.error("State machine returned None. Please check the implementation.")
                 return
@@ -361,7 +444,7 @@ def handle_continue():
         try:
             logger.info("Attempting to resume state machine with current state")
 
-            result = st.session_state.state_machine.resume(st.session_state.current_state)
+            result = stream_round(st.session_state.state_machine.stream_resume(st.session_state.current_state, thread_id=st.session_state.thread_id))
             
             if result is None:
                 st.error("State machine returned None. The conversation may have ended.")
@@ -384,7 +467,7 @@ def handle_retry():
     with st.spinner("Retrying last step..."):
         try:
             logger.info("Attempting to retry state machine with current state")
-            result = st.session_state.state_machine.resume(st.session_state.current_state)
+            result = stream_round(st.session_state.state_machine.stream_resume(st.session_state.current_state, thread_id=st.session_state.thread_id))
             
             if result is None:
                 st.error("State machine returned None. The conversation may have ended.")
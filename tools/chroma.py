@@ -1,20 +1,27 @@
 import os
 import asyncio
-from typing import List, Dict
+import queue
+import time
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, List, Dict, Optional
 import boto3
 import logging
 from dotenv import load_dotenv, set_key
 from chromadb import HttpClient
 from chromadb.utils import embedding_functions
-from llama_index.core import VectorStoreIndex, Document, StorageContext
+from llama_index.core import Document
+from llama_index.core.schema import MetadataMode
 from llama_index.vector_stores.chroma import ChromaVectorStore
 from llama_index.core.node_parser import (
     SentenceSplitter,
     SentenceWindowNodeParser,
     SemanticSplitterNodeParser
 )
-from llama_index.embeddings.openai import OpenAIEmbedding
-from llama_index.core import Settings
+from llama_index.core.embeddings import BaseEmbedding
+try:
+    from .embedding_cache import EmbeddingCache, MAX_BATCH_SIZE, MAX_BATCH_CHARS
+except ImportError:
+    from embedding_cache import EmbeddingCache, MAX_BATCH_SIZE, MAX_BATCH_CHARS
 
 # Load environment variables from .env file
 load_dotenv()
@@ -23,12 +30,41 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
 # Set up OpenAI embedding function
 openai_ef = embedding_functions.OpenAIEmbeddingFunction(
     api_key=os.getenv("OPENAI_API_KEY"),
-    model_name="text-embedding-ada-002"
+    model_name=EMBEDDING_MODEL
 )
 
+# Chunks embedded once are never sent to OpenAI again, across runs
+embedding_cache = EmbeddingCache(os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings"), EMBEDDING_MODEL)
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Embed texts with EMBEDDING_MODEL, sending only the ones not in the embedding cache."""
+    return embedding_cache.embed(texts, openai_ef)
+
+class CachedEmbedding(BaseEmbedding):
+    """llama_index embedding model backed by embed_texts, so parsers that embed (the semantic splitter) use the cache too."""
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return embed_texts(texts)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return embed_texts([text])[0]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._get_text_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await asyncio.to_thread(self._get_query_embedding, query)
+
+@lru_cache(maxsize=None)
+def get_chroma_client(host: str = 'localhost', port: int = 8000) -> HttpClient:
+    """One HTTP client per Chroma server, shared by every call."""
+    return HttpClient(host=host, port=port)
+
 def create_chroma_db(collection_name: str):
     """
     Create a Chroma DB collection and write the collection name to the .env file.
@@ -37,7 +73,7 @@ def create_chroma_db(collection_name: str):
         collection_name (str): The name of the Chroma collection to create.
     """
     # Initialize Chroma client
-    chroma_client = HttpClient(host='localhost', port=8000)
+    chroma_client = get_chroma_client()
 
     # Create Chroma collection
     chroma_collection = chroma_client.create_collection(name=collection_name)
@@ -56,63 +92,156 @@ def get_parser(parser_type: str):
     elif parser_type == 'SentenceWindowNodeParser':
         return SentenceWindowNodeParser(chunk_size=512, window_size=100)
     elif parser_type == 'SemanticSplitterNodeParser':
-        embed_model = OpenAIEmbedding(model="text-embedding-ada-002")
+        embed_model = CachedEmbedding(model_name=EMBEDDING_MODEL, embed_batch_size=MAX_BATCH_SIZE)
         return SemanticSplitterNodeParser(chunk_size=512, embed_model=embed_model)
     else:
         logger.warning(f"Unknown parser type: {parser_type}. Using SentenceSplitter by default.")
         return SentenceSplitter(chunk_size=512)
 
-async def add_articles_chroma_db(articles: List[Dict], collection_name: str, parser_type: str = 'SentenceSplitter', batch_size: int = 100):
+async def _run_stage(inbox: asyncio.Queue, outbox: Optional[asyncio.Queue], work: Callable[[Any], Awaitable[Any]], workers: int, consumers: int = 0):
+    """Run ``workers`` copies of ``work`` over ``inbox`` until each gets a None, then send ``consumers`` Nones on."""
+    async def worker():
+        while (item := await inbox.get()) is not None:
+            result = await work(item)
+            if outbox is not None:
+                await outbox.put(result)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    for _ in range(consumers):
+        await outbox.put(None)
+
+async def add_articles_chroma_db(
+    articles: List[Dict],
+    collection_name: str,
+    parser_type: str = 'SentenceSplitter',
+    batch_size: int = 20,
+    parse_workers: int = 4,
+    embed_workers: int = 4,
+    upsert_workers: int = 2,
+    queue_size: int = 8,
+) -> Dict[str, float]:
     """
     Add articles to the Chroma DB collection.
 
+    Ingestion is a pipeline of three stages, each with its own worker pool:
+    parsing articles into chunks, embedding the chunks in batches sized for the
+    embeddings API, and upserting them into Chroma. Stages are joined by queues
+    of ``queue_size`` items, so a slow stage holds back the ones before it.
+    Each parse worker has its own parser; the semantic splitter embeds sentences
+    through the embedding cache, so re-ingestion makes no embedding calls with
+    any parser type.
+
     Args:
         articles (List[Dict]): List of article dictionaries containing 'text' and metadata.
         collection_name (str): Name of the Chroma collection to use.
         parser_type (str): Type of parser to use for text splitting.
-        batch_size (int): Number of articles to process in each batch.
+        batch_size (int): Number of articles each parse worker splits at a time.
+        parse_workers (int): Threads splitting articles into chunks.
+        embed_workers (int): Concurrent embedding requests.
+        upsert_workers (int): Concurrent upserts into Chroma.
+        queue_size (int): Batches waiting between two stages before the earlier one blocks.
+
+    Returns:
+        Dict[str, float]: articles, chunks, seconds and chunks_per_second of the run.
     """
-    chroma_client = HttpClient(host='localhost', port=8000)
-    chroma_collection = chroma_client.get_collection(name=collection_name)
-    
+    chroma_collection = get_chroma_client().get_collection(name=collection_name)
     vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
-    storage_context = StorageContext.from_defaults(vector_store=vector_store)
-
-    parser = get_parser(parser_type)
-    Settings.embed_model = OpenAIEmbedding(model="text-embedding-ada-002")
-
-    for i in range(0, len(articles), batch_size):
-        batch = articles[i:i+batch_size]
-        documents = [
-            Document(text=article['article_body'], metadata={
-            'Author': article['Author'],
-            'date_published': article['date_published'],
-            'url': article['url']
-        })
-            for article in batch
-        ]
-
-
-        index = VectorStoreIndex.from_documents(
-            documents,
-            storage_context=storage_context,
-            transformations=[parser]
-        )
+    # Parsers keep state while splitting, so every parse worker takes one of its own
+    parsers = queue.SimpleQueue()
+    for _ in range(parse_workers):
+        parsers.put(get_parser(parser_type))
+
+    documents_queue = asyncio.Queue(maxsize=queue_size)
+    nodes_queue = asyncio.Queue(maxsize=queue_size)
+    embed_queue = asyncio.Queue(maxsize=queue_size)
+    upsert_queue = asyncio.Queue(maxsize=queue_size)
+    started = time.perf_counter()
+    chunks = 0
+
+    async def produce():
+        for i in range(0, len(articles), batch_size):
+            await documents_queue.put([
+                Document(text=article['article_body'], metadata={
+                    'Author': article['Author'],
+                    'date_published': article['date_published'],
+                    'url': article['url']
+                })
+                for article in articles[i:i+batch_size]
+            ])
+        for _ in range(parse_workers):
+            await documents_queue.put(None)
+
+    async def parse(documents):
+        parser = parsers.get_nowait()
+        try:
+            return await asyncio.to_thread(parser.get_nodes_from_documents, documents)
+        finally:
+            parsers.put(parser)
+
+    async def rebatch():
+        # Parsed chunks regrouped into the largest batches one embeddings request takes
+        batch, chars = [], 0
+        while (nodes := await nodes_queue.get()) is not None:
+            for node in nodes:
+                text = node.get_content(metadata_mode=MetadataMode.EMBED)
+                if batch and (len(batch) >= MAX_BATCH_SIZE or chars + len(text) > MAX_BATCH_CHARS):
+                    await embed_queue.put(batch)
+                    batch, chars = [], 0
+                batch.append((node, text))
+                chars += len(text)
+        if batch:
+            await embed_queue.put(batch)
+        for _ in range(embed_workers):
+            await embed_queue.put(None)
+
+    async def embed(batch):
+        embeddings = await asyncio.to_thread(embed_texts, [text for _, text in batch])
+        for (node, _), embedding in zip(batch, embeddings):
+            node.embedding = embedding
+        return [node for node, _ in batch]
+
+    async def upsert(nodes):
+        nonlocal chunks
+        await asyncio.to_thread(vector_store.add, nodes)
+        chunks += len(nodes)
+        elapsed = time.perf_counter() - started
+        logger.info(f"Upserted {len(nodes)} chunks into Chroma (total: {chunks}, {chunks / elapsed:.1f} chunks/s)")
 
-        logger.info(f"Added batch of {len(batch)} articles to Chroma (total: {i + len(batch)})")
+    tasks = [
+        asyncio.create_task(produce()),
+        asyncio.create_task(_run_stage(documents_queue, nodes_queue, parse, parse_workers, consumers=1)),
+        asyncio.create_task(rebatch()),
+        asyncio.create_task(_run_stage(embed_queue, upsert_queue, embed, embed_workers, consumers=upsert_workers)),
+        asyncio.create_task(_run_stage(upsert_queue, None, upsert, upsert_workers)),
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # A failed stage would leave the others waiting on its queue
+        for task in tasks:
+            task.cancel()
 
-    logger.info(f"All articles added to Chroma collection '{collection_name}'")
+    elapsed = time.perf_counter() - started
+    stats = {
+        'articles': len(articles),
+        'chunks': chunks,
+        'seconds': elapsed,
+        'chunks_per_second': chunks / elapsed if elapsed else 0.0,
+    }
+    logger.info(f"All articles added to Chroma collection '{collection_name}': {len(articles)} articles, {chunks} chunks in {elapsed:.1f}s ({stats['chunks_per_second']:.1f} chunks/s)")
+    return stats
 
 async def add_insights_chroma_db(insights_data: List[Dict], collection_name: str, batch_size: int = 100):
     """
     Add insights to the Chroma DB collection.
 
     Args:
-        insights_data (List[Dict]): List of dictionaries containing insights and metadata.
+        insights_data (List[Dict]): List of dictionaries containing insights and metadata
+            (e.g. get_insights.read_insights of an extract_insights_bulk output).
         collection_name (str): Name of the Chroma collection to use.
         batch_size (int): Number of insights to process in each batch.
     """
-    chroma_client = HttpClient(host='localhost', port=8000)
+    chroma_client = get_chroma_client()
     chroma_collection = chroma_client.get_collection(name=collection_name)
 
     for i in range(0, len(insights_data), batch_size):
@@ -122,7 +251,8 @@ async def add_insights_chroma_db(insights_data: List[Dict], collection_name: str
         metadatas = []
 
         for idx, item in enumerate(batch):
-            for insight in item['insights']:
+            # Failed extractions carry no insights
+            for insight in item.get('insights') or []:
                 documents.append(insight)
                 ids.append(f"{i + idx}_{len(documents)}")
                 metadatas.append({
@@ -131,8 +261,11 @@ async def add_insights_chroma_db(insights_data: List[Dict], collection_name: str
                     'url': item.get('url', 'Unknown')
                 })
 
+        if not documents:
+            continue
         chroma_collection.add(
             documents=documents,
+            embeddings=await asyncio.to_thread(embed_texts, documents),
             ids=ids,
             metadatas=metadatas
         )
@@ -150,7 +283,7 @@ def save_copy_chroma_db_s3(collection_name: str, s3_bucket: str, s3_key: str):
         s3_bucket (str): Name of the S3 bucket to save to.
         s3_key (str): S3 key (path) to save the DB copy to.
     """
-    chroma_client = HttpClient(host='localhost', port=8000)
+    chroma_client = get_chroma_client()
     chroma_collection = chroma_client.get_collection(name=collection_name)
 
     # Export the collection data
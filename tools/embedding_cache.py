@@ -0,0 +1,147 @@
+import os
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# OpenAI's embeddings endpoint takes at most 2048 inputs (and ~300k tokens) per request
+MAX_BATCH_SIZE = 2048
+MAX_BATCH_CHARS = 600_000
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def embedding_batches(texts: Sequence[str], max_batch_size: int = MAX_BATCH_SIZE, max_batch_chars: int = MAX_BATCH_CHARS) -> Iterator[List[str]]:
+    """Split texts into the largest batches one embeddings request accepts."""
+    batch, chars = [], 0
+    for text in texts:
+        if batch and (len(batch) >= max_batch_size or chars + len(text) > max_batch_chars):
+            yield batch
+            batch, chars = [], 0
+        batch.append(text)
+        chars += len(text)
+    if batch:
+        yield batch
+
+
+class EmbeddingCache:
+    """Embeddings of one model keyed by the SHA-256 of the embedded text.
+
+    Vectors are appended to ``<model>.f32``, a float32 matrix read through a
+    memory map, and ``<model>.idx`` maps each content hash to its row. Both
+    files are append-only, so a crash loses at most the rows being written.
+    Meant for one writing process at a time.
+    """
+
+    def __init__(self, directory: str, model: str):
+        self.model = model
+        os.makedirs(directory, exist_ok=True)
+        stem = os.path.join(directory, model.replace("/", "_"))
+        self.vectors_path = f"{stem}.f32"
+        self.index_path = f"{stem}.idx"
+        self.dim: Optional[int] = None
+        self.rows: Dict[str, int] = {}
+        self._matrix: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, encoding="utf-8") as f:
+            header = f.readline().split()
+            if len(header) != 3 or header[:2] != ["#", "dim"]:
+                logger.warning(f"Ignoring embedding cache {self.index_path} with a bad header")
+                return
+            self.dim = int(header[2])
+            for line in f:
+                digest, _, row = line.strip().partition(" ")
+                if row.isdigit():
+                    self.rows[digest] = int(row)
+        # Rows of the index whose vector never made it to disk are dropped
+        stored = self._stored_rows()
+        self.rows = {digest: row for digest, row in self.rows.items() if row < stored}
+        logger.info(f"Embedding cache {self.index_path}: {len(self.rows)} vectors")
+
+    def _stored_rows(self) -> int:
+        if self.dim is None or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (4 * self.dim)
+
+    def _map(self, needed_rows: int) -> np.memmap:
+        if self._matrix is None or len(self._matrix) < needed_rows:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self._stored_rows(), self.dim))
+        return self._matrix
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Cached vectors of ``texts`` in order, None for misses, read in one gather."""
+        with self._lock:
+            rows = [self.rows.get(content_hash(text)) for text in texts]
+            hits = [(i, row) for i, row in enumerate(rows) if row is not None]
+            result: List[Optional[np.ndarray]] = [None] * len(texts)
+            if hits:
+                matrix = self._map(max(row for _, row in hits) + 1)
+                vectors = np.array(matrix[[row for _, row in hits]])
+                for (i, _), vector in zip(hits, vectors):
+                    result[i] = vector
+            return result
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        with self._lock:
+            new = {}
+            for text, vector in zip(texts, vectors):
+                digest = content_hash(text)
+                if digest not in self.rows and digest not in new:
+                    new[digest] = vector
+            if not new:
+                return
+            matrix = np.asarray(list(new.values()), dtype=np.float32)
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+                with open(self.index_path, "w", encoding="utf-8") as f:
+                    f.write(f"# dim {self.dim}\n")
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding cache for {self.model} holds {self.dim}-d vectors, got {matrix.shape[1]}-d")
+            first = self._stored_rows()
+            # Vectors first, so every indexed row is on disk; a torn last row is overwritten
+            if os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path) != first * 4 * self.dim:
+                os.truncate(self.vectors_path, first * 4 * self.dim)
+            with open(self.vectors_path, "ab") as f:
+                f.write(matrix.tobytes())
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.writelines(f"{digest} {first + i}\n" for i, digest in enumerate(new))
+            self.rows.update((digest, first + i) for i, digest in enumerate(new))
+
+    def _misses(self, texts: Sequence[str]):
+        cached = self.get_many(texts)
+        # Duplicates in the input are embedded once
+        misses = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        return cached, misses
+
+    def _merge(self, texts: Sequence[str], cached: List[Optional[np.ndarray]], misses: List[str], embedded: List[Sequence[float]]) -> List[List[float]]:
+        if misses:
+            self.put_many(misses, embedded)
+            logger.info(f"Embedded {len(misses)} of {len(texts)} texts with {self.model}, {len(texts) - len(misses)} from cache")
+        fresh = dict(zip(misses, embedded))
+        return [vector.tolist() if vector is not None else list(fresh[text]) for text, vector in zip(texts, cached)]
+
+    def embed(self, texts: Sequence[str], embed_batch: Callable[[List[str]], List[Sequence[float]]], **batching: Any) -> List[List[float]]:
+        """Vectors of ``texts``; only misses go to ``embed_batch``, in the largest batches allowed."""
+        cached, misses = self._misses(texts)
+        embedded = [vector for batch in embedding_batches(misses, **batching) for vector in embed_batch(batch)]
+        return self._merge(texts, cached, misses, embedded)
+
+    async def aembed(self, texts: Sequence[str], aembed_batch: Callable[[List[str]], Any], **batching: Any) -> List[List[float]]:
+        cached, misses = self._misses(texts)
+        embedded = []
+        for batch in embedding_batches(misses, **batching):
+            embedded.extend(await aembed_batch(batch))
+        return self._merge(texts, cached, misses, embedded)
@@ -1,20 +1,89 @@
 import os
+import json
+import random
+import time
 import asyncio
-from typing import List
+import argparse
+import logging
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+import openai
 from pydantic import BaseModel
 from openai import AsyncOpenAI
 
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-4o-mini"
+# Insights restate the article, so they need about as many tokens as it has (~4 characters each),
+# plus headroom: a cap of a third of its characters, within the model's output limit (gpt-4o-mini: 16384)
+MIN_INSIGHT_TOKENS = 1000
+MAX_INSIGHT_TOKENS = 16384
+# Longer articles are extracted part by part, so no part needs more than MAX_INSIGHT_TOKENS
+MAX_PART_CHARS = 3 * MAX_INSIGHT_TOKENS - 1000
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+class Insight(BaseModel):
+    content: str
+
 class ArticleInsights(BaseModel):
     insights: List[Insight]
 
-async def extract_article_insights(article: dict[str, str]) -> dict[str, any]:
-    client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    
+@lru_cache(maxsize=None)
+def get_client() -> AsyncOpenAI:
+    """One client (and connection pool) for every extraction; retries are ours, with jitter."""
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+
+def insight_token_cap(article_body: str) -> int:
+    return min(MAX_INSIGHT_TOKENS, max(MIN_INSIGHT_TOKENS, len(article_body) // 3))
+
+def split_article(article_body: str, max_chars: int = MAX_PART_CHARS) -> List[str]:
+    """Split an article into parts of at most ``max_chars``, at paragraph breaks where possible."""
+    parts, current = [], ""
+    for paragraph in article_body.split("\n"):
+        while len(paragraph) > max_chars:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(paragraph[:max_chars])
+            paragraph = paragraph[max_chars:]
+        if current and len(current) + 1 + len(paragraph) > max_chars:
+            parts.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n{paragraph}" if current else paragraph
+    if current or not parts:
+        parts.append(current)
+    return parts
+
+async def with_retries(call: Callable[[], Awaitable[Any]], attempts: int = 6, base_delay: float = 1.0, max_delay: float = 60.0) -> Any:
+    """Await ``call()``, retrying rate limits, timeouts and server errors with full-jitter exponential backoff."""
+    for attempt in range(attempts):
+        try:
+            return await call()
+        except RETRYABLE_ERRORS as e:
+            if attempt == attempts - 1:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            logger.warning(f"{type(e).__name__}, retry {attempt + 1}/{attempts - 1} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+async def extract_article_insights(article: dict[str, str], client: Optional[AsyncOpenAI] = None, model: str = DEFAULT_MODEL) -> dict[str, Any]:
+    client = client or get_client()
+    insights = []
+    # One request per part of a long article, one after the other so the caller's concurrency bound holds
+    for part in split_article(article['article_body']):
+        insights.extend(await _extract_insights(part, client, model))
+    return {
+        "title": article.get('title', 'N/A'),
+        "insights": insights
+    }
+
+async def _extract_insights(article_body: str, client: AsyncOpenAI, model: str) -> List[str]:
     prompt = f"""
     Analyze the following article and extract key insights. Each insight should be a complete, self-contained sentence that captures a significant piece of information from the article. The insights should collectively cover all the important information in the article, even if this means some information is repeated across multiple insights.
 
     Article:
-    {article['article_body']}
+    {article_body}
 
     Instructions:
     1. Read and analyze the entire article carefully.
@@ -71,20 +140,156 @@ async def extract_article_insights(article: dict[str, str]) -> dict[str, any]:
 
     """
 
-    completion = await client.chat.completions.create(
-        model="gpt-4o-mini",
+    completion = await with_retries(lambda: client.beta.chat.completions.parse(
+        model=model,
         messages=[
             {"role": "system", "content": "You are a highly skilled AI assistant specializing in extracting insights from articles."},
             {"role": "user", "content": prompt}
         ],
-        max_tokens=max(1000, len(article['article_body']) * 4),
+        max_tokens=insight_token_cap(article_body),
         temperature=0.315,
-        response_model=ArticleInsights
-    )
+        response_format=ArticleInsights
+    ))
 
-    insights = completion.choices[0].message.content
+    message = completion.choices[0].message
+    if message.parsed is None:
+        raise ValueError(f"No insights returned: {message.refusal or 'empty response'}")
 
-    return {
-        "title": article.get('title', 'N/A'),
-        "insights": [insight.content for insight in insights.insights]
+    return [insight.content for insight in message.parsed.insights]
+
+def article_id(article: Dict[str, Any], position: int) -> str:
+    return str(article.get('id') or article.get('url') or article.get('title') or position)
+
+def read_articles(path: str) -> List[Dict[str, Any]]:
+    """Articles from a JSON list or a JSONL file of article dicts (``article_body`` plus metadata)."""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            articles = [json.loads(line) for line in f if line.strip()]
+        else:
+            articles = json.load(f)
+    return [{**article, "id": article_id(article, i)} for i, article in enumerate(articles)]
+
+def failures_path(output_path: str) -> str:
+    """Where extract_insights_bulk lists the articles that failed, next to ``output_path``."""
+    root, _ = os.path.splitext(output_path)
+    return f"{root}.failed.jsonl"
+
+def read_insights(path: str) -> List[Dict[str, Any]]:
+    """Extracted articles of an insights JSONL file, ready for add_insights_chroma_db.
+
+    Keeps the last line of each id and skips failed records (files written before
+    failures went to their own file) and a last line cut short by a crash.
+    """
+    records: Dict[str, Dict[str, Any]] = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("status") == "failed" or "insights" not in record:
+                    continue
+                records.pop(str(record.get("id")), None)
+                records[str(record.get("id"))] = record
+    return list(records.values())
+
+def done_ids(output_path: str) -> Set[str]:
+    """Ids already extracted into ``output_path`` by an earlier run (failed articles are retried)."""
+    return {str(record["id"]) for record in read_insights(output_path) if "id" in record}
+
+async def extract_insights_bulk(
+    articles: Iterable[Dict[str, Any]],
+    output_path: str,
+    concurrency: int = 16,
+    model: str = DEFAULT_MODEL,
+    append: bool = False,
+) -> Dict[str, Any]:
+    """
+    Extract insights of every article, ``concurrency`` at a time, writing one JSONL line per article as it finishes.
+
+    Lines carry the article's id, title, Author, date_published and url next to
+    its insights; read_insights() loads them for add_insights_chroma_db. Articles
+    that still fail after retries are listed, with their error, in
+    failures_path(output_path) instead, which each run rewrites.
+
+    Returns:
+        Dict[str, Any]: articles, extracted, failed, insights, seconds and articles_per_minute.
+    """
+    client = get_client()
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {"extracted": 0, "failed": 0, "insights": 0}
+    started = time.perf_counter()
+
+    if os.path.dirname(output_path):
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "a" if append else "w", encoding="utf-8") as output, \
+            open(failures_path(output_path), "w", encoding="utf-8") as failures:
+
+        async def run(position: int, article: Dict[str, Any]) -> None:
+            record = {
+                "id": article_id(article, position),
+                "title": article.get('title', 'N/A'),
+                "Author": article.get('Author', 'Unknown'),
+                "date_published": article.get('date_published', 'Unknown'),
+                "url": article.get('url', 'Unknown'),
+            }
+            async with semaphore:
+                try:
+                    result = await extract_article_insights(article, client=client, model=model)
+                except Exception as e:
+                    logger.error(f"Could not extract insights of {record['id']}: {e}")
+                    record.update(status="failed", error=f"{type(e).__name__}: {e}")
+                    counts["failed"] += 1
+                else:
+                    record.update(status="ok", insights=result["insights"])
+                    counts["extracted"] += 1
+                    counts["insights"] += len(result["insights"])
+            destination = failures if record["status"] == "failed" else output
+            destination.write(json.dumps(record, ensure_ascii=False) + "\n")
+            destination.flush()
+            done = counts["extracted"] + counts["failed"]
+            if done % 25 == 0:
+                logger.info(f"{done} articles done ({done * 60 / (time.perf_counter() - started):.1f} articles/min)")
+
+        articles = list(articles)
+        await asyncio.gather(*(run(i, article) for i, article in enumerate(articles)))
+
+    elapsed = time.perf_counter() - started
+    report = {
+        "articles": len(articles),
+        **counts,
+        "seconds": elapsed,
+        "articles_per_minute": len(articles) * 60 / elapsed if elapsed else 0.0,
     }
+    logger.info(f"Insights of {report['extracted']} articles written to {output_path} in {elapsed:.1f}s"
+                + (f", {report['failed']} failures listed in {failures_path(output_path)}" if report['failed'] else ""))
+    return report
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Extract insights of scraped articles and stream them to JSONL.")
+    parser.add_argument("input", help="JSON list or JSONL file of articles (article_body, title, Author, date_published, url)")
+    parser.add_argument("--output", "-o", default="insights.jsonl", help="JSONL file receiving one line per article")
+    parser.add_argument("--concurrency", type=int, default=16, help="Articles in flight")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--limit", type=int, default=None, help="Only extract the first N articles")
+    parser.add_argument("--resume", action="store_true", help="Append to --output and skip articles it already holds")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    articles = read_articles(args.input)[:args.limit]
+    if args.resume:
+        skip = done_ids(args.output)
+        articles = [article for article in articles if article["id"] not in skip]
+        logger.info(f"Skipping {len(skip)} articles already in {args.output}")
+    if not articles:
+        logger.info("Nothing to extract")
+        return 0
+
+    report = asyncio.run(extract_insights_bulk(articles, args.output, args.concurrency, args.model, append=args.resume))
+    print(json.dumps(report, indent=2))
+    return 1 if report["failed"] else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())